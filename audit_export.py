@@ -0,0 +1,229 @@
+"""
+Streaming columnar export of audit records (Arrow IPC or Parquet).
+
+Records are read from the audit log one line at a time, filtered by store,
+section and time range, and converted into Arrow record batches of
+`batch_size` rows. Each batch is written out (one Parquet row group or one
+IPC message) and dropped before the next is built, so memory stays bounded
+by the batch size no matter how many records are exported.
+
+Used by GET /admin/export and as a CLI:
+
+    python audit_export.py --format parquet --output audits.parquet \\
+        --store 42 --section "Beverages" --start 2026-10-01 --end 2026-10-31
+"""
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 8192
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+SCORE_FIELDS = ("position_match", "stock_completeness", "overall_compliance", "overall_match_pct")
+
+PRICE_DEVIATION_TYPE = pa.struct([
+    ("product", pa.string()),
+    ("observed", pa.float64()),
+    ("standard", pa.float64()),
+    ("deviation", pa.float64()),
+])
+
+AUDIT_SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("us")),
+        ("store", pa.string()),
+        ("section", pa.string()),
+        ("filename", pa.string()),
+        ("compliance_status", pa.string()),
+        ("has_reference", pa.bool_()),
+        ("reference_version", pa.string()),
+    ]
+    + [(name, pa.float64()) for name in SCORE_FIELDS]
+    + [
+        ("missing_products", pa.list_(pa.string())),
+        ("price_deviations", pa.list_(PRICE_DEVIATION_TYPE)),
+    ]
+)
+
+
+def _to_local(value):
+    # Audit timestamps are naive server-local time (datetime.now()), so compare in that
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def parse_time(value, end_of_day=False):
+    """
+    Parse an ISO date/datetime filter value (None passes through). A bare
+    date used as an upper bound covers that whole day; values with a UTC
+    offset are converted to the server's local time.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return _to_local(parsed)
+
+
+def filter_records(lines, store=None, section=None, start=None, end=None):
+    """
+    Parse JSON lines and yield the records matching every given filter.
+    Unreadable lines (e.g. truncated by a crash mid-append) are logged and
+    skipped so one bad line cannot abort an export that is already streaming.
+    """
+    start = _to_local(start) if start else None
+    end = _to_local(end) if end else None
+    skipped = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+            timestamp = _to_local(datetime.fromisoformat(record["timestamp"]))
+        except (ValueError, TypeError, KeyError):
+            skipped += 1
+            logger.warning(f"Skipping unreadable audit log line: {line[:80]!r}")
+            continue
+        if store is not None and record.get("store") != store:
+            continue
+        if section is not None and record.get("section") != section:
+            continue
+        if start is not None and timestamp < start:
+            continue
+        if end is not None and timestamp > end:
+            continue
+        yield record
+    if skipped:
+        logger.warning(f"Skipped {skipped} unreadable audit log line(s)")
+
+
+def _to_batch(columns):
+    arrays = [pa.array(columns["timestamp"], pa.string()).cast(pa.timestamp("us"))]
+    for field in list(AUDIT_SCHEMA)[1:]:
+        arrays.append(pa.array(columns[field.name], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=AUDIT_SCHEMA)
+
+
+def record_batches(records, batch_size=DEFAULT_BATCH_SIZE):
+    """Group records into Arrow record batches of at most `batch_size` rows"""
+    names = AUDIT_SCHEMA.names
+    columns = {name: [] for name in names}
+    rows = 0
+    for record in records:
+        scores = record.get("scores") or {}
+        columns["timestamp"].append(record["timestamp"])
+        columns["store"].append(record.get("store"))
+        columns["section"].append(record.get("section"))
+        columns["filename"].append(record.get("filename"))
+        columns["compliance_status"].append(record.get("compliance_status"))
+        columns["has_reference"].append(record.get("has_reference"))
+        columns["reference_version"].append(record.get("reference_version"))
+        for name in SCORE_FIELDS:
+            columns[name].append(scores.get(name))
+        columns["missing_products"].append(record.get("missing_products") or [])
+        columns["price_deviations"].append(record.get("price_deviations") or [])
+        rows += 1
+        if rows == batch_size:
+            yield _to_batch(columns)
+            columns = {name: [] for name in names}
+            rows = 0
+    if rows:
+        yield _to_batch(columns)
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_export(batches, export_format="arrow"):
+    """
+    Yield the encoded export chunk by chunk (one IPC message or Parquet row
+    group at a time) so it can be streamed straight into an HTTP response
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, AUDIT_SCHEMA, compression="zstd")
+    else:
+        writer = ipc.new_stream(sink, AUDIT_SCHEMA)
+
+    for batch in batches:
+        if export_format == "parquet":
+            writer.write_table(pa.Table.from_batches([batch]), row_group_size=batch.num_rows)
+        else:
+            writer.write_batch(batch)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def export_audits(audit_log, export_format="arrow", store=None, section=None, start=None, end=None,
+                  batch_size=DEFAULT_BATCH_SIZE):
+    """Stream matching audit records from `audit_log` as encoded chunks"""
+    start = _to_local(start) if start else None
+    end = _to_local(end) if end else None
+    records = filter_records(audit_log.lines(start, end), store, section, start, end)
+    return stream_export(record_batches(records, batch_size), export_format)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export audit records as Arrow IPC or Parquet")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    parser.add_argument("--log-dir", help="Audit log directory (default: $AUDIT_LOG_DIR or audit_log)")
+    parser.add_argument("--store", help="Only this store (X-Store-Id)")
+    parser.add_argument("--section", help="Only this shelf section")
+    parser.add_argument("--start", help="Earliest timestamp, ISO format (e.g. 2026-10-01)")
+    parser.add_argument("--end", help="Latest timestamp, ISO format (e.g. 2026-10-31T23:59:59)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per batch / row group")
+    args = parser.parse_args(argv)
+
+    audit_log = AuditLog(args.log_dir) if args.log_dir else AuditLog()
+    chunks = export_audits(audit_log, args.format, args.store, args.section,
+                           parse_time(args.start), parse_time(args.end, end_of_day=True), args.batch_size)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
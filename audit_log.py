@@ -0,0 +1,133 @@
+"""
+Append-only log of audit outcomes for chain-wide analytics.
+
+Every /audit call appends one JSON line to audit_log/<YYYY-MM-DD>.jsonl with
+the fields `audit_shelf` returns (timestamp, filename, compliance_status,
+has_reference, ...) plus the store, section, parsed scores, missing products
+and price deviations. One file per day lets exports skip whole days that fall
+outside a requested time range. See audit_export.py for the columnar export.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+AUDIT_LOG_DIR = os.getenv("AUDIT_LOG_DIR", "audit_log")
+
+MISSING_PATTERN = re.compile(r"❌\s*MISSING:\s*([^<\n]+)")
+PRICED_PRODUCT_PATTERN = re.compile(r"✓\s*([^:\n]+?):\s*\$(\d+(?:\.\d{1,2})?)")
+SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?\s*(?:ml|l))\b", re.IGNORECASE)
+
+
+def extract_missing_products(analysis):
+    """Product names from the report's "❌ MISSING: ..." lines, in order, without duplicates"""
+    missing = []
+    for match in MISSING_PATTERN.finditer(analysis or ""):
+        name = match.group(1).strip()
+        if name and not name.startswith("[") and name not in missing:
+            missing.append(name)
+    return missing
+
+
+def _standard_price(product, standard_prices):
+    """Look up the standard price for a product name like "Coca-Cola Classic 500ml" """
+    size_match = SIZE_PATTERN.search(product)
+    if not size_match:
+        return None
+    size = size_match.group(1).replace(" ", "").lower()
+    for brand, sizes in standard_prices.items():
+        if brand.lower() in product.lower():
+            for standard_size, price in sizes.items():
+                if standard_size.lower() == size:
+                    return price
+    return None
+
+
+def extract_price_deviations(analysis, standard_prices):
+    """Products whose price on the shelf differs from the standard price list"""
+    deviations = []
+    seen = set()
+    for match in PRICED_PRODUCT_PATTERN.finditer(analysis or ""):
+        product = match.group(1).strip()
+        if product in seen or product.startswith("["):
+            continue
+        seen.add(product)
+        standard = _standard_price(product, standard_prices)
+        if standard is None:
+            continue
+        observed = float(match.group(2))
+        if abs(observed - standard) >= 0.005:
+            deviations.append({
+                "product": product,
+                "observed": observed,
+                "standard": standard,
+                "deviation": round(observed - standard, 2),
+            })
+    return deviations
+
+
+class AuditLog:
+    """Thread-safe, append-only JSONL audit log partitioned by day"""
+
+    def __init__(self, log_dir=AUDIT_LOG_DIR):
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+
+    def path_for(self, day):
+        return os.path.join(self.log_dir, f"{day}.jsonl")
+
+    def append(self, record):
+        """Append one record (runs in a worker thread; never raises)"""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        day = record["timestamp"][:10]
+        try:
+            with self._lock:
+                os.makedirs(self.log_dir, exist_ok=True)
+                with open(self.path_for(day), "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            logger.error(f"Could not write audit log record: {str(e)}")
+
+    def files(self, start=None, end=None):
+        """Log files overlapping [start, end] (datetimes or None), oldest first"""
+        if not os.path.isdir(self.log_dir):
+            return []
+        paths = []
+        for name in sorted(os.listdir(self.log_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            day = name[:-len(".jsonl")]
+            if start is not None and day < start.date().isoformat():
+                continue
+            if end is not None and day > end.date().isoformat():
+                continue
+            paths.append(os.path.join(self.log_dir, name))
+        return paths
+
+    def lines(self, start=None, end=None):
+        """Yield raw JSON lines from the relevant files, one at a time"""
+        for path in self.files(start, end):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield line
+
+
+def build_record(result, analysis, store, section, standard_prices):
+    """Turn an /audit result into an audit log record"""
+    return {
+        "timestamp": result["timestamp"],
+        "store": store,
+        "section": section,
+        "filename": result.get("filename"),
+        "compliance_status": result["compliance_status"],
+        "has_reference": result["has_reference"],
+        "reference_version": result.get("reference_version"),
+        "scores": result.get("scores") or {},
+        "missing_products": extract_missing_products(analysis),
+        "price_deviations": extract_price_deviations(analysis, standard_prices),
+    }
@@ -0,0 +1,633 @@
+"""
+Load-testing benchmark for Shelf-Eye Agent
+
+Drives the API endpoints at a configurable concurrency and writes a JSON
+report (p50/p95/p99 latency, throughput, app memory during each scenario,
+model calls) that can be diffed between releases. The audit-burst scenario also reports how many
+frames/second the frame-selection stage scores; together with audit-per-frame
+(the same burst sent one frame per request) it measures the model calls that
+frame selection saves. --export-records N also
+streams N synthetic audit records through the Arrow/Parquet exporter and
+reports records/second and peak memory.
+
+By default the app is loaded in-process with the model client in replay mode
+(see model_harness.py), so no Gemini quota is used. Pass --url to benchmark a
+running server instead.
+
+Usage:
+    python benchmark.py --requests 200 --concurrency 16 --latency-ms 800-1500
+    python benchmark.py --output bench_report.json --baseline old_report.json
+    python benchmark.py --scenarios audit --export-records 10000000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_IMAGE = REPO_DIR / "wrong order.png"
+DEFAULT_REFERENCE_IMAGE = REPO_DIR / "correct order of image.png"
+
+SEPARATOR = "═" * 63
+
+
+def _sample_analysis(products=12, missing=3):
+    """A model report shaped like the real thing: box separators, emoji, red HTML spans"""
+    lines = [SEPARATOR, "📋 PRODUCTS & PRICES OVERVIEW", SEPARATOR]
+    lines += [f"✓ Brand {i} Cola 500ml: $2.{i:02d} - Present on shelf" for i in range(products)]
+    lines += [SEPARATOR, "📋 EXECUTIVE SUMMARY", SEPARATOR,
+              f"• Total Products in Reference: {products + missing}",
+              f"• Products Found in Test Image: {products}",
+              f"• Missing Products (Empty Spaces): {missing}",
+              "• Overall Match: 80%",
+              SEPARATOR, "🚨 CRITICAL: MISSING PRODUCTS (EMPTY SHELF SPACES)", SEPARATOR]
+    for i in range(missing):
+        lines += [
+            '<span style="color: red; font-weight: bold;">🔴 EMPTY SPACE DETECTED - MISSING PRODUCT</span>',
+            f'<span style="color: red;">❌ MISSING: Missing Brand {i} Original 500ml Bottle</span>',
+            f'   <span style="color: red;">• Expected Position: Row {i + 1}, Position 3 (Center Shelf)</span>',
+            '   <span style="color: red;">• Status: ⚠️ EMPTY SHELF SPACE - NO PRODUCT PRESENT</span>',
+            '   <span style="color: red;">• Product Price (from reference): $2.49</span>',
+            '   <span style="color: red;">• 📦 ORDER URGENCY: CRITICAL - Restock within 24 hours</span>',
+        ]
+    lines += [SEPARATOR, "✅ PRODUCTS CORRECTLY POSITIONED (MATCHING REFERENCE)", SEPARATOR]
+    for i in range(products):
+        lines += [f"✓ Brand {i} Cola 500ml", f"  • Position: Row {i // 4 + 1}, Position {i % 4 + 1} - MATCHES REFERENCE ✓",
+                  f"  • Product Price (from test image): $2.{i:02d}", "  • Status: CORRECT PLACEMENT ✓"]
+    lines += [SEPARATOR, "📊 COMPLIANCE METRICS", SEPARATOR,
+              "• Position Match Score: 80/100", "• Stock Completeness: 80/100", "• Overall Compliance: 80/100",
+              SEPARATOR]
+    return "\n".join(lines)
+
+
+# Canned model answer used when no recorded fixture matches a request
+REPLAY_FALLBACK_TEXT = _sample_analysis()
+
+
+def _file_request(path, field="file"):
+    """Build multipart kwargs for a single image upload"""
+    data = Path(path).read_bytes()
+    mime_type = "image/png" if str(path).lower().endswith(".png") else "image/jpeg"
+    return lambda: {"files": {field: (Path(path).name, data, mime_type)}}
+
+
+def _unique_file_request(path, field="file"):
+    """Like _file_request, but every upload has distinct bytes (a new reference version)"""
+    data = Path(path).read_bytes()
+    mime_type = "image/png" if str(path).lower().endswith(".png") else "image/jpeg"
+    counter = itertools.count()
+    return lambda: {"files": {field: (Path(path).name, data + next(counter).to_bytes(8, "big"), mime_type)}}
+
+
+def make_burst(path, size):
+    """
+    Simulate a shaky burst from one photo: progressively blurred and
+    under-exposed copies around a single sharp frame
+    """
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(Path(path).read_bytes(), dtype=np.uint8), cv2.IMREAD_COLOR)
+    frames = []
+    sharp_index = size // 2
+    for index in range(size):
+        frame = image
+        distance = abs(index - sharp_index)
+        if distance:
+            kernel = 4 * distance + 1
+            frame = cv2.GaussianBlur(frame, (kernel, kernel), 0)
+            frame = cv2.convertScaleAbs(frame, alpha=max(0.3, 1 - 0.1 * distance))
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return frames
+
+
+def _compact_request(args):
+    build_files = _file_request(args.image)
+    return lambda: dict(build_files(), params={"format": "compact"})
+
+
+def _burst_request(args):
+    frames = make_burst(args.image, args.burst_size)
+    return lambda: {"files": [("file", (f"frame_{i}.jpg", data, "image/jpeg")) for i, data in enumerate(frames)]}
+
+
+def _per_frame_request(args):
+    """The same burst without frame selection: every frame audited as its own request"""
+    frames = make_burst(args.image, args.burst_size)
+    counter = itertools.count()
+
+    def build():
+        index = next(counter) % len(frames)
+        return {"files": {"file": (f"frame_{index}.jpg", frames[index], "image/jpeg")}}
+    return build
+
+
+# name -> (HTTP method, path, request kwargs factory built from CLI args)
+SCENARIOS = {
+    "audit": ("POST", "/audit", lambda args: _file_request(args.image)),
+    "audit-burst": ("POST", "/audit", _burst_request),
+    "audit-per-frame": ("POST", "/audit", _per_frame_request),
+    "audit-compact": ("POST", "/audit", _compact_request),
+    "upload-reference": ("POST", "/admin/upload-reference", lambda args: _unique_file_request(args.reference_image)),
+}
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def max_rss_mb():
+    """Peak resident set size of this process in MB"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def _status_mb(pid, field):
+    """A memory field (e.g. VmRSS) of /proc/<pid>/status in MB, or None"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_peak_rss_mb():
+    """
+    Peak RSS of this process image from /proc (VmHWM). Unlike ru_maxrss it
+    resets on exec, so a spawned worker doesn't inherit its parent's peak.
+    Falls back to ru_maxrss where /proc is unavailable.
+    """
+    peak = _status_mb("self", "VmHWM")
+    return max_rss_mb() if peak is None else peak
+
+
+def process_tree_rss_mb():
+    """
+    Current RSS of this process plus all its descendants (the frame-scoring
+    forkserver and its workers) in MB, or None where /proc is unavailable
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces, so split after its closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total = 0.0
+    pending = [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        total += _status_mb(pid, "VmRSS") or 0.0
+        pending.extend(children.get(pid, ()))
+    return total
+
+
+class RssSampler:
+    """
+    Samples process_tree_rss_mb() on a background thread while a scenario
+    runs. Unlike ru_maxrss, which only ever grows, the start/end/peak it
+    reports belong to that scenario alone and include the worker processes.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start = self.end = self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = process_tree_rss_mb()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start = self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = self._sample()
+
+    def summary(self):
+        if self.start is None:
+            return None
+        return {"start": round(self.start, 1), "end": round(self.end, 1), "peak": round(self.peak, 1)}
+
+
+async def run_scenario(http_client, method, path, build_kwargs, total, concurrency, tenants=1):
+    """Send `total` requests with at most `concurrency` in flight, spread round-robin over `tenants` stores"""
+    latencies = []
+    response_bytes = []
+    status_counts = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request(number):
+        headers = {"X-Store-Id": f"bench-{number % tenants}"}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await http_client.request(method, path, headers=headers, **build_kwargs())
+                status = str(response.status_code)
+                response_bytes.append(response.num_bytes_downloaded)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request(number) for number in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in status_counts.items() if not status.startswith("2"))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "status_counts": status_counts,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        # Bytes on the wire, i.e. after any Content-Encoding
+        "response_bytes_mean": round(sum(response_bytes) / len(response_bytes)) if response_bytes else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+    }
+
+
+def model_call_savings(scenarios, burst_size):
+    """
+    Measured model calls per burst with frame selection (audit-burst) vs.
+    auditing every frame separately (audit-per-frame)
+    """
+    burst = scenarios.get("audit-burst", {}).get("model_calls_per_request")
+    per_frame = scenarios.get("audit-per-frame", {}).get("model_calls_per_request")
+    if burst is None or per_frame is None:
+        return None
+    without_selection = per_frame * burst_size
+    return {
+        "model_calls_per_burst": burst,
+        "model_calls_per_burst_without_selection": round(without_selection, 3),
+        "model_calls_saved_per_burst": round(without_selection - burst, 3),
+    }
+
+
+def benchmark_frame_scoring(args):
+    """Measure frames/second scored by the frame-selection process pool"""
+    import frame_selection
+
+    frames = make_burst(args.image, args.burst_size)
+    batches = max(1, args.requests // 10)
+
+    async def score_all():
+        # Warm the pool so worker start-up isn't counted
+        await frame_selection.select_frames([(frames[0], "image/jpeg"), (frames[1], "image/jpeg")])
+        started = time.perf_counter()
+        for _ in range(batches):
+            await frame_selection.select_frames([(data, "image/jpeg") for data in frames])
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(score_all())
+    scored = batches * len(frames)
+    return {
+        "frames_scored": scored,
+        "burst_size": len(frames),
+        "workers": frame_selection.FRAME_SCORING_WORKERS,
+        "duration_s": round(elapsed, 3),
+        "frames_per_s": round(scored / elapsed, 2),
+    }
+
+
+def benchmark_response_modes(iterations=200):
+    """Response bytes and serialization (+compression) time for each projection/encoding/compression mode"""
+    from response_format import COMPACT_FIELDS, compress, encode, extract_scores, project
+
+    analysis = _sample_analysis()
+    full = {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "filename": "shelf.jpg",
+        "analysis": analysis,
+        "compliance_status": "issues",
+        "scores": extract_scores(analysis),
+        "has_reference": True,
+        "reference_version": "0123456789abcdef",
+    }
+    modes = {}
+    for projection in ("full", "compact"):
+        for encoding in ("json", "msgpack"):
+            for coding in ("identity", "gzip", "br"):
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    result = project(full, COMPACT_FIELDS) if projection == "compact" else full
+                    body, _ = encode(result, use_msgpack=encoding == "msgpack")
+                    body = compress(body, coding)
+                elapsed = time.perf_counter() - started
+                modes[f"{projection}/{encoding}/{coding}"] = {
+                    "bytes": len(body),
+                    "serialize_us": round(elapsed / iterations * 1e6, 1),
+                }
+    return modes
+
+
+def _export_worker(records, export_format, batch_size):
+    """Runs in a spawned process and reports that process's own peak RSS (VmHWM)"""
+    import pyarrow as pa
+    from audit_export import filter_records, record_batches, stream_export
+    from audit_log import extract_missing_products
+
+    analysis = _sample_analysis()
+    templates = []
+    for store in range(8):
+        templates.append(json.dumps({
+            "timestamp": datetime.now().isoformat(),
+            "store": str(store),
+            "section": ("Beverages", "Snacks")[store % 2],
+            "filename": "shelf.jpg",
+            "compliance_status": "issues",
+            "has_reference": True,
+            "reference_version": "0123456789abcdef",
+            "scores": {"position_match": 80.0, "stock_completeness": 75.0,
+                       "overall_compliance": 78.0, "overall_match_pct": 77.0},
+            "missing_products": extract_missing_products(analysis),
+            "price_deviations": [{"product": "Coca-Cola Classic 500ml", "observed": 3.49,
+                                  "standard": 2.99, "deviation": 0.5}],
+        }) + "\n")
+    lines = itertools.islice(itertools.cycle(templates), records)
+
+    started = time.perf_counter()
+    written = 0
+    for chunk in stream_export(record_batches(filter_records(lines), batch_size), export_format):
+        written += len(chunk)
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "format": export_format,
+        "batch_size": batch_size,
+        "bytes": written,
+        "duration_s": round(elapsed, 3),
+        "records_per_s": round(records / elapsed, 1),
+        "max_rss_mb": round(process_peak_rss_mb(), 1),
+        "arrow_pool_max_mb": round(pa.default_memory_pool().max_memory() / (1024 * 1024), 1),
+    }
+
+
+def benchmark_export(records, batch_size=None):
+    """Stream `records` synthetic audit records through each export format, each in its own process"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from audit_export import DEFAULT_BATCH_SIZE, EXPORT_FORMATS
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for export_format in EXPORT_FORMATS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            future = pool.submit(_export_worker, records, export_format, batch_size or DEFAULT_BATCH_SIZE)
+            results[export_format] = future.result()
+    return results
+
+
+def use_replay_mode(latency_ms):
+    """
+    Configure the model harness and scheduler for in-process runs. Must run
+    before model_harness or scheduler are imported, as they read these once.
+    """
+    os.environ.setdefault("MODEL_MODE", "replay")
+    os.environ.setdefault("MODEL_REPLAY_FALLBACK", REPLAY_FALLBACK_TEXT)
+    os.environ["MODEL_REPLAY_LATENCY_MS"] = latency_ms
+    # Measure the app, not the per-store rate limit (override via env to test it)
+    os.environ.setdefault("TENANT_RPM", "0")
+
+
+def load_app(latency_ms):
+    """Import main.py in replay mode, isolated in a scratch working directory"""
+    use_replay_mode(latency_ms)
+    # main.py uses relative paths for backend_reference/, keep the repo clean
+    os.chdir(tempfile.mkdtemp(prefix="shelf-eye-bench-"))
+    sys.path.insert(0, str(REPO_DIR))
+    import main
+    # Per-request INFO logs would dominate the console and skew timings
+    for name in ("main", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return main.app
+
+
+def available_routes(app):
+    return {(method, route.path) for route in app.routes for method in getattr(route, "methods", ())}
+
+
+async def run_benchmark(args):
+    model_client = None
+    if args.url:
+        transport = None
+        base_url = args.url.rstrip("/")
+        routes = None
+    else:
+        app = load_app(args.latency_ms)
+        model_client = sys.modules["main"].client
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+        routes = available_routes(app)
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "config": {
+            "target": args.url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "tenants": args.tenants,
+            "burst_size": args.burst_size,
+            "replay_latency_ms": None if args.url else args.latency_ms,
+            "trace_memory": args.trace_memory,
+            "python": platform.python_version(),
+        },
+        "scenarios": {},
+    }
+
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=timeout) as http_client:
+        for name in args.scenarios:
+            method, path, factory = SCENARIOS[name]
+            if routes is not None and (method, path) not in routes:
+                print(f"⏭️  Skipping {name}: {method} {path} not served by this build")
+                continue
+            print(f"🚀 {name}: {args.requests} requests @ concurrency {args.concurrency}")
+            if args.trace_memory:
+                tracemalloc.start()
+            calls_before = getattr(model_client, "calls", None)
+            with RssSampler() as rss:
+                result = await run_scenario(http_client, method, path, factory(args), args.requests,
+                                            args.concurrency, args.tenants)
+            if calls_before is not None:
+                model_calls = model_client.calls - calls_before
+                result["model_calls"] = model_calls
+                result["model_calls_per_request"] = round(model_calls / args.requests, 3)
+            if args.trace_memory:
+                result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+                tracemalloc.stop()
+            if not args.url:
+                # The app's own memory; against --url this process is only the load generator
+                result["rss_mb"] = rss.summary()
+            report["scenarios"][name] = result
+
+    if not args.url:
+        report["scheduler"] = sys.modules["main"].model_scheduler.metrics()
+        # Whole-run high-water mark of the benchmark process (app included); depends on scenario order
+        report["run_peak_rss_mb"] = round(max_rss_mb(), 1)
+    return report
+
+
+def compare_reports(baseline, current):
+    """Print per-scenario deltas against a previous report"""
+    print("\n📈 Change vs baseline:")
+    for name, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            print(f"  {name}: no baseline")
+            continue
+        parts = []
+        for pct in ("p50", "p95", "p99"):
+            before, after = old["latency_ms"][pct], result["latency_ms"][pct]
+            parts.append(f"{pct} {before:.0f}→{after:.0f}ms")
+        parts.append(f"rps {old['throughput_rps']}→{result['throughput_rps']}")
+        before, after = (old.get("rss_mb") or {}).get("peak"), (result.get("rss_mb") or {}).get("peak")
+        if before is not None and after is not None:
+            parts.append(f"rss peak {before:.0f}→{after:.0f}MB")
+        print(f"  {name}: " + ", ".join(parts))
+
+
+def print_summary(report):
+    print("\n" + "=" * 60)
+    for name, result in report["scenarios"].items():
+        lat = result["latency_ms"]
+        rss = result.get("rss_mb")
+        print(f"{name:>18}: p50 {lat['p50']:.1f}ms  p95 {lat['p95']:.1f}ms  p99 {lat['p99']:.1f}ms  "
+              f"{result['throughput_rps']} req/s  errors {result['errors']}"
+              + (f"  rss peak {rss['peak']}MB" if rss else ""))
+    if "run_peak_rss_mb" in report:
+        print(f"{'run peak rss':>18}: {report['run_peak_rss_mb']}MB (benchmark process, whole run)")
+    print("\nResponse modes (projection/encoding/compression):")
+    for mode, result in report["response_modes"].items():
+        print(f"  {mode:>24}: {result['bytes']:>6} bytes  {result['serialize_us']:>8.1f}µs")
+    if "frame_scoring" in report:
+        scoring = report["frame_scoring"]
+        print(f"     frame scoring: {scoring['frames_per_s']} frames/s on {scoring['workers']} worker(s)")
+    if "model_call_savings" in report:
+        savings = report["model_call_savings"]
+        print(f"  frame selection: {savings['model_calls_per_burst']} model calls per burst vs "
+              f"{savings['model_calls_per_burst_without_selection']} auditing every frame")
+    for export_format, result in report.get("export", {}).items():
+        print(f"{'export ' + export_format:>18}: {result['records']} records in {result['duration_s']}s "
+              f"({result['records_per_s']} records/s)  {result['bytes']} bytes  rss {result['max_rss_mb']}MB  "
+              f"arrow pool {result['arrow_pool_max_mb']}MB")
+    print("=" * 60)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shelf-Eye Agent load benchmark")
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--tenants", type=int, default=1, help="Spread requests over this many X-Store-Id values")
+    parser.add_argument("--latency-ms", default="0",
+                        help='Synthetic model latency in replay mode: "1200", "800-2000" or "recorded"')
+    parser.add_argument("--burst-size", type=int, default=8, help="Frames per request in the audit-burst scenario")
+    parser.add_argument("--image", default=str(DEFAULT_IMAGE), help="Shelf image used for /audit")
+    parser.add_argument("--reference-image", default=str(DEFAULT_REFERENCE_IMAGE),
+                        help="Image used for /admin/upload-reference")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record the Python heap peak per scenario (in-process only, slows requests down)")
+    parser.add_argument("--export-records", type=int, default=0,
+                        help="Also stream this many synthetic audit records through the Arrow/Parquet export")
+    parser.add_argument("--export-batch-size", type=int, help="Rows per export batch (default: audit_export's)")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    if args.trace_memory and args.url:
+        parser.error("--trace-memory only works for the in-process app")
+    # Resolve paths before load_app() changes the working directory
+    args.image = str(Path(args.image).resolve())
+    args.reference_image = str(Path(args.reference_image).resolve())
+    if args.output:
+        args.output = str(Path(args.output).resolve())
+    if args.baseline:
+        args.baseline = str(Path(args.baseline).resolve())
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+    if "audit-burst" in args.scenarios and not args.url:
+        report["frame_scoring"] = benchmark_frame_scoring(args)
+    savings = model_call_savings(report["scenarios"], args.burst_size)
+    if savings:
+        report["model_call_savings"] = savings
+    report["response_modes"] = benchmark_response_modes()
+    if args.export_records:
+        report["export"] = benchmark_export(args.export_records, args.export_batch_size)
+    print_summary(report)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare_reports(json.load(f), report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\n📝 Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
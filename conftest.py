@@ -0,0 +1,20 @@
+"""Shared pytest fixtures: the app in replay mode, isolated in a scratch working directory"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmark import load_app, use_replay_mode
+
+# Test modules import model_harness / scheduler at collection, before the app fixture runs
+use_replay_mode("0")
+
+
+@pytest.fixture(scope="session")
+def app():
+    return load_app("0")
+
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,249 @@
+"""
+Burst/video frame selection for shelf audits.
+
+Scores every frame of a photo burst or short video clip on CPU and picks the
+best one (or a small set) to send to the model, so a shaky capture does not
+turn into a retake and a second model call.
+
+Each frame is scored on:
+- sharpness: variance of the Laplacian (higher = less blur)
+- exposure:  how close brightness is to mid-grey, penalised for clipping
+- coverage:  share of the frame with product-like texture (edge density)
+
+Decoding and scoring run in a process pool so they never block the event loop.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default pool size is capped because a container sees the host's CPUs, not its quota
+MAX_DEFAULT_WORKERS = 4
+
+
+def default_workers():
+    """CPUs this process may run on (affinity-aware where supported), capped at MAX_DEFAULT_WORKERS"""
+    if hasattr(os, "sched_getaffinity"):
+        available = len(os.sched_getaffinity(0))
+    else:
+        available = os.cpu_count() or 1
+    return max(1, min(available, MAX_DEFAULT_WORKERS))
+
+
+FRAME_SCORING_WORKERS = int(os.getenv("FRAME_SCORING_WORKERS", "0")) or default_workers()
+MAX_BURST_FRAMES = int(os.getenv("MAX_BURST_FRAMES", "60"))
+VIDEO_SAMPLE_FRAMES = int(os.getenv("VIDEO_SAMPLE_FRAMES", "24"))
+
+# Frames are scored on a downscaled copy so scores don't depend on resolution
+SCORING_MAX_SIDE = 640
+COVERAGE_GRID = 8
+COVERAGE_EDGE_DENSITY = 0.04
+CLIP_LOW, CLIP_HIGH = 8, 247
+
+# Frames below these are only sent when nothing better is available
+MIN_SHARPNESS = 50.0
+MIN_EXPOSURE = 0.35
+
+SCORE_WEIGHTS = {"sharpness": 0.5, "exposure": 0.25, "coverage": 0.25}
+
+_pool = None
+
+
+def _start_method():
+    # Forking a server that already runs threads (executor, model client) can deadlock the child
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_pool():
+    """Lazily create the shared frame-scoring process pool"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=FRAME_SCORING_WORKERS,
+                                    mp_context=multiprocessing.get_context(_start_method()))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _discard_broken_pool(pool):
+    # A concurrent request may already have replaced the shared pool
+    if pool is _pool:
+        shutdown_pool()
+    else:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_scoring_gray(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape
+    scale = SCORING_MAX_SIDE / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def score_frame(image):
+    """Return raw quality metrics for a decoded BGR or grayscale frame"""
+    gray = _to_scoring_gray(image)
+
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    mean = float(gray.mean())
+    clipped = float(np.count_nonzero((gray <= CLIP_LOW) | (gray >= CLIP_HIGH))) / gray.size
+    exposure = max(0.0, 1.0 - abs(mean - 128.0) / 128.0 - clipped)
+
+    edges = cv2.Canny(gray, 50, 150)
+    height, width = edges.shape
+    cell_h, cell_w = height // COVERAGE_GRID, width // COVERAGE_GRID
+    cells = edges[:cell_h * COVERAGE_GRID, :cell_w * COVERAGE_GRID]
+    cells = cells.reshape(COVERAGE_GRID, cell_h, COVERAGE_GRID, cell_w)
+    density = (cells > 0).mean(axis=(1, 3))
+    coverage = float((density >= COVERAGE_EDGE_DENSITY).mean())
+
+    return {
+        "sharpness": round(sharpness, 2),
+        "exposure": round(exposure, 4),
+        "brightness": round(mean, 2),
+        "coverage": round(coverage, 4),
+    }
+
+
+def score_image_bytes(data):
+    """Decode an encoded image and score it (runs in a worker process)"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return score_frame(image)
+
+
+def score_video_bytes(data, suffix=".mp4", sample_frames=VIDEO_SAMPLE_FRAMES):
+    """
+    Decode a video clip, score evenly spaced frames and return
+    (scores, jpeg_bytes) for every sampled frame (runs in a worker process)
+    """
+    # OpenCV can only open videos from a path
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        tmp.write(data)
+        tmp.flush()
+        capture = cv2.VideoCapture(tmp.name)
+        try:
+            total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            if total <= 0:
+                return []
+            wanted = set(np.linspace(0, total - 1, min(sample_frames, total)).astype(int).tolist())
+            results = []
+            index = 0
+            while wanted and index <= max(wanted):
+                ok = capture.grab()
+                if not ok:
+                    break
+                if index in wanted:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        encoded_ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
+                        if encoded_ok:
+                            scores = score_frame(frame)
+                            scores["source_frame"] = index
+                            results.append((scores, encoded.tobytes()))
+                    wanted.discard(index)
+                index += 1
+            return results
+        finally:
+            capture.release()
+
+
+def rank_frames(scores, max_frames=1):
+    """
+    Combine raw metrics into a 0-1 score and pick the frames to send.
+
+    Sharpness is normalised against the sharpest frame in the set since the
+    Laplacian variance has no fixed upper bound. Returns (scored, selected)
+    where `scored` is a list of dicts with an "index" and "score" and
+    `selected` lists the chosen indices, best first.
+    """
+    valid = [(index, s) for index, s in enumerate(scores) if s is not None]
+    if not valid:
+        return [], []
+
+    max_sharpness = max(s["sharpness"] for _, s in valid) or 1.0
+    scored = []
+    for index, s in valid:
+        combined = (SCORE_WEIGHTS["sharpness"] * s["sharpness"] / max_sharpness
+                    + SCORE_WEIGHTS["exposure"] * s["exposure"]
+                    + SCORE_WEIGHTS["coverage"] * s["coverage"])
+        scored.append(dict(s, index=index, score=round(combined, 4)))
+
+    ranked = sorted(scored, key=lambda s: s["score"], reverse=True)
+    usable = [s for s in ranked if s["sharpness"] >= MIN_SHARPNESS and s["exposure"] >= MIN_EXPOSURE]
+    selected = [s["index"] for s in (usable or ranked)[:max(1, max_frames)]]
+    return scored, selected
+
+
+async def _score_frames(pool, frames):
+    loop = asyncio.get_running_loop()
+    if len(frames) == 1 and frames[0][1].startswith("video/"):
+        data, content_type = frames[0]
+        suffix = "." + content_type.split("/", 1)[1].split(";")[0].replace("quicktime", "mov")
+        sampled = await loop.run_in_executor(pool, score_video_bytes, data, suffix)
+        if not sampled:
+            raise ValueError("Could not decode any frames from the video")
+        candidates = [(jpeg, "image/jpeg") for _, jpeg in sampled]
+        return candidates, [s for s, _ in sampled], "video"
+    scores = await asyncio.gather(*(
+        loop.run_in_executor(pool, score_image_bytes, data) for data, _ in frames
+    ))
+    return frames, scores, "burst"
+
+
+async def select_frames(frames, max_frames=1):
+    """
+    Score a burst and pick the best frames.
+
+    `frames` is a list of (bytes, content_type) tuples; a single video entry
+    is expanded into sampled frames. Returns (selected, report) where
+    `selected` is a list of (bytes, content_type) ready for the model.
+
+    If a worker dies (e.g. OOM-killed on a large video) the pool is broken
+    for good, so it is replaced and the frames are scored once more; a
+    second failure raises BrokenProcessPool.
+    """
+    pool = get_pool()
+    try:
+        candidates, scores, source = await _score_frames(pool, frames)
+    except BrokenProcessPool:
+        logger.warning("Frame-scoring pool broke, retrying on a fresh pool")
+        _discard_broken_pool(pool)
+        pool = get_pool()
+        try:
+            candidates, scores, source = await _score_frames(pool, frames)
+        except BrokenProcessPool:
+            _discard_broken_pool(pool)
+            raise
+
+    scored, selected = rank_frames(scores, max_frames)
+    if not selected:
+        raise ValueError("None of the uploaded frames could be decoded as images")
+
+    report = {
+        "source": source,
+        "frames_received": len(candidates),
+        "frames_decoded": len(scored),
+        "selected_frames": selected,
+        "scores": scored,
+    }
+    logger.info(f"Frame selection: {len(candidates)} {source} frames, selected {selected}")
+    return [candidates[index] for index in selected], report
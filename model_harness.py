@@ -0,0 +1,179 @@
+"""
+Record/replay harness for the Gemini model client.
+
+Wraps ``genai.Client`` so that ``client.models.generate_content(...)`` can be
+recorded to disk and replayed later without spending API quota.
+
+Modes (``MODEL_MODE`` environment variable):
+- ``live``   - pass every call straight through to Gemini (default)
+- ``record`` - call Gemini and save each response as a fixture
+- ``replay`` - answer from fixtures only, never touching the network
+
+Fixtures are JSON files named after a hash of the model name, the prompt text
+and the image bytes, so the same prompt + image always maps to the same file.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+MODEL_MODE = os.getenv("MODEL_MODE", "live")
+MODEL_FIXTURES_DIR = os.getenv("MODEL_FIXTURES_DIR", "fixtures/model")
+# "", "recorded", "1200" (fixed ms) or "800-2000" (uniform range in ms)
+MODEL_REPLAY_LATENCY_MS = os.getenv("MODEL_REPLAY_LATENCY_MS", "")
+# Text returned on a replay miss; when unset a miss raises FixtureNotFound
+MODEL_REPLAY_FALLBACK = os.getenv("MODEL_REPLAY_FALLBACK")
+
+
+class FixtureNotFound(LookupError):
+    """Raised in replay mode when no fixture matches a request"""
+
+
+class ReplayResponse:
+    """Minimal stand-in for a genai response; callers only read ``.text``"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def hash_contents(model, contents):
+    """Return (fixture_key, prompt_sha, image_sha) for a generate_content call"""
+    prompt_hash = hashlib.sha256()
+    image_hash = hashlib.sha256()
+    for part in contents:
+        if isinstance(part, str):
+            prompt_hash.update(part.encode("utf-8"))
+        else:
+            inline = getattr(part, "inline_data", None)
+            if inline is not None and inline.data is not None:
+                image_hash.update((inline.mime_type or "").encode("utf-8"))
+                image_hash.update(inline.data)
+            elif getattr(part, "text", None):
+                prompt_hash.update(part.text.encode("utf-8"))
+    prompt_sha = prompt_hash.hexdigest()
+    image_sha = image_hash.hexdigest()
+    key = hashlib.sha256(f"{model}\0{prompt_sha}\0{image_sha}".encode("utf-8")).hexdigest()
+    return key, prompt_sha, image_sha
+
+
+def parse_latency(spec):
+    """Parse a latency spec into None, "recorded" or a (low_ms, high_ms) range"""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    if spec == "recorded":
+        return "recorded"
+    if "-" in spec:
+        low, high = spec.split("-", 1)
+        return float(low), float(high)
+    return float(spec), float(spec)
+
+
+class _RecordReplayModels:
+    """Drop-in replacement for ``genai.Client().models``"""
+
+    def __init__(self, harness):
+        self._harness = harness
+
+    def generate_content(self, model, contents, **kwargs):
+        return self._harness.generate_content(model, contents, **kwargs)
+
+
+class RecordReplayClient:
+    """Model client that records or replays ``generate_content`` calls"""
+
+    def __init__(self, live_client=None, mode="live", fixtures_dir=MODEL_FIXTURES_DIR,
+                 latency=None, fallback_text=None):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown model mode: {mode}")
+        if mode != "replay" and live_client is None:
+            raise ValueError(f"A live client is required in {mode} mode")
+        self.live_client = live_client
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.latency = parse_latency(latency)
+        self.fallback_text = fallback_text
+        self.calls = 0
+        self.models = _RecordReplayModels(self)
+
+    def fixture_path(self, key):
+        return os.path.join(self.fixtures_dir, f"{key}.json")
+
+    def generate_content(self, model, contents, **kwargs):
+        self.calls += 1
+        if self.mode == "live":
+            return self.live_client.models.generate_content(model=model, contents=contents, **kwargs)
+
+        key, prompt_sha, image_sha = hash_contents(model, contents)
+
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = self.live_client.models.generate_content(model=model, contents=contents, **kwargs)
+            latency_ms = (time.perf_counter() - started) * 1000
+            self._save_fixture(key, {
+                "model": model,
+                "prompt_sha256": prompt_sha,
+                "image_sha256": image_sha,
+                "latency_ms": round(latency_ms, 1),
+                "text": response.text,
+            })
+            return response
+
+        fixture = self._load_fixture(key)
+        if fixture is None:
+            if self.fallback_text is None:
+                raise FixtureNotFound(f"No recorded fixture for key {key} (model={model})")
+            logger.debug(f"Replay miss for {key}, using fallback response")
+            fixture = {"text": self.fallback_text, "latency_ms": 0}
+        self._sleep(fixture)
+        return ReplayResponse(fixture["text"])
+
+    def _save_fixture(self, key, fixture):
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        path = self.fixture_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(fixture, f, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Recorded model fixture {key}")
+
+    def _load_fixture(self, key):
+        path = self.fixture_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _sleep(self, fixture):
+        if self.latency is None:
+            return
+        if self.latency == "recorded":
+            delay_ms = fixture.get("latency_ms", 0)
+        else:
+            low, high = self.latency
+            delay_ms = random.uniform(low, high)
+        # Blocking sleep on purpose: the real client call is synchronous too
+        time.sleep(delay_ms / 1000)
+
+
+def build_model_client(api_key):
+    """Create the model client selected by the MODEL_* environment variables"""
+    live_client = None
+    if MODEL_MODE != "replay":
+        from google import genai
+        live_client = genai.Client(api_key=api_key)
+        if MODEL_MODE == "live":
+            return live_client
+    logger.info(f"Model client running in {MODEL_MODE} mode (fixtures: {MODEL_FIXTURES_DIR})")
+    return RecordReplayClient(
+        live_client=live_client,
+        mode=MODEL_MODE,
+        fixtures_dir=MODEL_FIXTURES_DIR,
+        latency=MODEL_REPLAY_LATENCY_MS,
+        fallback_text=MODEL_REPLAY_FALLBACK,
+    )
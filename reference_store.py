@@ -0,0 +1,322 @@
+"""
+Versioned, content-addressed storage for backend reference images.
+
+Layout on disk (under backend_reference/):
+
+    versions/<version>/image.<ext>   uploaded reference image
+    versions/<version>/meta.json     upload metadata
+    versions/<version>/layout.json   extracted layout, present once analyzed
+    active.json                      pointer to the version audits use
+
+A version id is the first 16 hex chars of the image's SHA-256, so uploading
+the same image twice reuses the existing version. Every file is written to a
+temporary name and atomically renamed into place, and the active pointer only
+switches once the new layout is ready, so audits never see a half-written
+image or a stale layout. Analysis runs in the background; its progress is
+tracked as a job.
+
+This process is the only writer of active.json, so the pointer is read once
+at startup and then kept in memory (with the active layout cached), and
+audits never touch the disk to find their reference.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_ROOT = "backend_reference"
+REFERENCE_HISTORY = int(os.getenv("REFERENCE_HISTORY", "5"))
+MAX_TRACKED_JOBS = 100
+
+VERSION_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+
+class ReferenceNotFound(LookupError):
+    """Raised when a requested reference version does not exist or is not ready"""
+
+
+def _atomic_write(path, data):
+    """Write bytes to `path` via a temp file + rename so readers never see partial data"""
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _atomic_write_json(path, payload):
+    _atomic_write(path, json.dumps(payload, indent=2).encode("utf-8"))
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ReferenceStore:
+    """Versioned reference images with background analysis and atomic activation"""
+
+    def __init__(self, root=REFERENCE_ROOT, history=REFERENCE_HISTORY):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.active_path = os.path.join(root, "active.json")
+        self.history = max(1, history)
+        self.jobs = OrderedDict()
+        # Versions are immutable once analyzed, so layouts can be cached forever
+        self._layouts = {}
+        self._tasks = set()
+        # Serializes writes to the store (images, active pointer, pruning) and the sequence counters
+        self._lock = threading.Lock()
+        self._upload_seq = 0
+        self._activated_seq = 0
+        # version -> uploads of it still being stored or analyzed; never pruned
+        self._busy = Counter()
+        self._busy_lock = threading.Lock()
+        pointer = _read_json(self.active_path)
+        self._active = pointer["version"] if pointer else None
+        if self._active is not None:
+            self._load_layout(self._active)
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    # -- reading -----------------------------------------------------------
+
+    def active_version(self):
+        """Version id the pointer currently selects, or None"""
+        return self._active
+
+    def _load_layout(self, version):
+        if not VERSION_PATTERN.fullmatch(version or ""):
+            return None
+        layout = self._layouts.get(version)
+        if layout is None:
+            layout = _read_json(os.path.join(self.version_dir(version), "layout.json"))
+            if layout is not None:
+                self._layouts[version] = layout
+        return layout
+
+    def get_layout(self, version=None):
+        """
+        Return (version, layout) for a pinned version or the active one.
+        (None, None) when no reference is active; raises ReferenceNotFound
+        for a pinned version that is unknown or still being analyzed.
+        """
+        if version is None:
+            version = self.active_version()
+            if version is None:
+                return None, None
+        layout = self._load_layout(version)
+        if layout is None:
+            raise ReferenceNotFound(f"Reference version {version} not found or not analyzed yet")
+        return version, layout
+
+    def list_versions(self):
+        """All stored versions, newest upload first"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        active = self.active_version()
+        versions = []
+        for version in os.listdir(self.versions_dir):
+            meta = _read_json(os.path.join(self.version_dir(version), "meta.json"))
+            if meta is None:
+                continue
+            ready = os.path.exists(os.path.join(self.version_dir(version), "layout.json"))
+            versions.append(dict(meta, ready=ready, active=version == active))
+        versions.sort(key=lambda v: v["uploaded_at"], reverse=True)
+        return versions
+
+    # -- writing -----------------------------------------------------------
+
+    def _mark_busy(self, version):
+        with self._busy_lock:
+            self._busy[version] += 1
+
+    def _mark_idle(self, version):
+        with self._busy_lock:
+            self._busy[version] -= 1
+            if self._busy[version] <= 0:
+                del self._busy[version]
+
+    def _store_image(self, data, mime_type, filename, sha256):
+        """
+        Write the image and metadata for a new version (runs in a thread).
+        Returns the upload's sequence number, used to order activations.
+        """
+        with self._lock:
+            self._write_version(data, mime_type, filename, sha256)
+            self._upload_seq += 1
+            return self._upload_seq
+
+    def _write_version(self, data, mime_type, filename, sha256):
+        version = sha256[:16]
+        directory = self.version_dir(version)
+        os.makedirs(directory, exist_ok=True)
+        image_name = "image" + EXTENSIONS.get(mime_type, ".img")
+        image_path = os.path.join(directory, image_name)
+        if not os.path.exists(image_path):
+            _atomic_write(image_path, data)
+        meta = {
+            "version": version,
+            "sha256": sha256,
+            "mime_type": mime_type,
+            "image": image_name,
+            "size": len(data),
+            "filename": filename,
+            "uploaded_at": datetime.now().isoformat(),
+        }
+        _atomic_write_json(os.path.join(directory, "meta.json"), meta)
+
+    def _activate(self, version):
+        _atomic_write_json(self.active_path, {"version": version, "activated_at": datetime.now().isoformat()})
+        self._active = version
+        logger.info(f"Active reference switched to version {version}")
+
+    def _prune(self):
+        """
+        Keep the active version plus the `history - 1` newest others; versions
+        still being stored or analyzed are never pruned. Call with self._lock held.
+        """
+        with self._busy_lock:
+            busy = set(self._busy)
+        others = [v for v in self.list_versions() if not v["active"] and v["version"] not in busy]
+        for entry in others[self.history - 1:]:
+            shutil.rmtree(self.version_dir(entry["version"]), ignore_errors=True)
+            self._layouts.pop(entry["version"], None)
+            logger.info(f"Pruned reference version {entry['version']}")
+
+    def activate(self, version):
+        """Point audits at an existing, analyzed version (e.g. to roll back)"""
+        with self._lock:
+            if self._load_layout(version) is None:
+                raise ReferenceNotFound(f"Reference version {version} not found or not analyzed yet")
+            self._upload_seq += 1
+            self._activated_seq = self._upload_seq
+            self._activate(version)
+
+    def _new_job(self, version):
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "version": version,
+            "status": "pending",
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+        }
+        self.jobs[job["job_id"]] = job
+        while len(self.jobs) > MAX_TRACKED_JOBS:
+            self.jobs.popitem(last=False)
+        return job
+
+    def _finish_job(self, job, status, error=None):
+        job["status"] = status
+        job["error"] = error
+        job["finished_at"] = datetime.now().isoformat()
+
+    async def submit(self, data, mime_type, filename, analyze):
+        """
+        Store a new reference image and analyze it in the background.
+
+        `analyze(image_bytes, mime_type)` is an async callable returning the
+        layout dict (or None on failure). Returns the job dict immediately.
+        """
+        loop = asyncio.get_running_loop()
+        sha256 = await loop.run_in_executor(None, lambda: hashlib.sha256(data).hexdigest())
+        version = sha256[:16]
+        # Busy before anything is written, so a concurrent prune can't delete the new version
+        self._mark_busy(version)
+        job = self._new_job(version)
+        try:
+            seq = await loop.run_in_executor(None, self._store_image, data, mime_type, filename, sha256)
+            if self._load_layout(version) is not None:
+                # Same image as an existing version: nothing to analyze
+                await loop.run_in_executor(None, self._activate_if_newest, version, seq)
+                self._finish_job(job, "ready")
+                self._mark_idle(version)
+                return job
+        except Exception as e:
+            self._finish_job(job, "failed", str(e))
+            self._mark_idle(version)
+            raise
+
+        task = asyncio.create_task(self._analyze(job, seq, data, mime_type, analyze))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _activate_if_newest(self, version, seq):
+        # A slower analysis of an older upload must not override a newer one
+        with self._lock:
+            if seq > self._activated_seq:
+                self._activated_seq = seq
+                self._activate(version)
+            self._prune()
+
+    def _write_layout(self, version, layout):
+        _atomic_write_json(os.path.join(self.version_dir(version), "layout.json"), layout)
+
+    async def _analyze(self, job, seq, data, mime_type, analyze):
+        loop = asyncio.get_running_loop()
+        job["status"] = "running"
+        try:
+            layout = await analyze(data, mime_type)
+            if layout is None:
+                raise RuntimeError("Reference analysis returned no layout")
+            layout = dict(layout, version=job["version"])
+            await loop.run_in_executor(None, self._write_layout, job["version"], layout)
+            self._layouts[job["version"]] = layout
+            await loop.run_in_executor(None, self._activate_if_newest, job["version"], seq)
+            self._finish_job(job, "ready")
+        except Exception as e:
+            logger.error(f"Reference analysis for version {job['version']} failed: {str(e)}")
+            self._finish_job(job, "failed", str(e))
+        finally:
+            self._mark_idle(job["version"])
+
+    async def import_legacy(self, image_path, layout_path, analyze):
+        """
+        Move a pre-versioning correct_shelf.jpg / layout.json into the store
+        when nothing is active yet. Returns the job, or None if there was
+        nothing to import.
+        """
+        if self.active_version() is not None or not os.path.exists(image_path):
+            return None
+        loop = asyncio.get_running_loop()
+        with open(image_path, "rb") as f:
+            data = f.read()
+        legacy_layout = _read_json(layout_path)
+        if legacy_layout is not None:
+            # Already analyzed before versioning existed, no need to call the model again
+            sha256 = hashlib.sha256(data).hexdigest()
+            version = sha256[:16]
+            self._mark_busy(version)
+            try:
+                await loop.run_in_executor(None, self._store_image, data, "image/jpeg",
+                                           os.path.basename(image_path), sha256)
+                layout = dict(legacy_layout, version=version)
+                await loop.run_in_executor(None, self._write_layout, version, layout)
+                await loop.run_in_executor(None, self.activate, version)
+            finally:
+                self._mark_idle(version)
+            logger.info(f"Imported legacy reference as version {version}")
+            return None
+        return await self.submit(data, "image/jpeg", os.path.basename(image_path), analyze)
@@ -0,0 +1,219 @@
+"""
+Response shaping for API clients.
+
+- Field projection: `?fields=compliance_status,scores` or `?format=compact`
+  drops the long prose `analysis` for machine clients.
+- Encoding: clients sending `Accept: application/msgpack` get MessagePack
+  instead of JSON.
+- Compression: CompressionMiddleware gzip/brotli-encodes responses according
+  to `Accept-Encoding`.
+"""
+
+import gzip
+import json
+import re
+
+import brotli
+import msgpack
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# What format=compact returns: the status, the scores and where they came from
+COMPACT_FIELDS = (
+    "status",
+    "timestamp",
+    "filename",
+    "compliance_status",
+    "has_reference",
+    "reference_version",
+    "scores",
+)
+RESPONSE_FORMATS = ("full", "compact")
+
+SCORE_PATTERNS = {
+    "position_match": re.compile(r"Position Match Score:\**\s*(\d+(?:\.\d+)?)\s*/\s*100", re.IGNORECASE),
+    "stock_completeness": re.compile(r"Stock Completeness:\**\s*(\d+(?:\.\d+)?)\s*/\s*100", re.IGNORECASE),
+    "overall_compliance": re.compile(r"Overall Compliance:\**\s*(\d+(?:\.\d+)?)\s*/\s*100", re.IGNORECASE),
+    "overall_match_pct": re.compile(r"Overall Match:\**\s*(\d+(?:\.\d+)?)\s*%", re.IGNORECASE),
+}
+
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/", "application/javascript")
+COMPRESSION_MIN_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def extract_scores(analysis):
+    """Pull the numeric scores out of the model's prose report (missing ones are None)"""
+    scores = {}
+    for name, pattern in SCORE_PATTERNS.items():
+        match = pattern.search(analysis or "")
+        scores[name] = float(match.group(1)) if match else None
+    return scores
+
+
+def project(result, fields):
+    """Keep only `fields` from `result`; dotted names select nested keys (frame_selection.selected_frames)"""
+    projected = {}
+    for field in fields:
+        source, target = result, projected
+        parts = field.split(".")
+        for part in parts[:-1]:
+            if not isinstance(source.get(part), dict):
+                source = None
+                break
+            source = source[part]
+            target = target.setdefault(part, {})
+        if source is not None and parts[-1] in source:
+            target[parts[-1]] = source[parts[-1]]
+    return projected
+
+
+def parse_qvalues(header):
+    """Return {token: q} from an Accept / Accept-Encoding style header"""
+    values = {}
+    for item in (header or "").split(","):
+        token, *params = item.strip().split(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        values[token] = q
+    return values
+
+
+def wants_msgpack(request):
+    """MessagePack only when the client lists it with q > 0 and ranks it at least as high as JSON"""
+    accepted = parse_qvalues(request.headers.get("accept"))
+    msgpack_q = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    if msgpack_q <= 0:
+        return False
+    json_q = accepted.get("application/json", accepted.get("application/*", accepted.get("*/*", 0.0)))
+    return msgpack_q >= json_q
+
+
+def encode(result, use_msgpack=False):
+    """Serialize a result dict to (body, media_type)"""
+    if use_msgpack:
+        return msgpack.packb(result, use_bin_type=True), "application/msgpack"
+    # Same settings JSONResponse uses
+    body = json.dumps(result, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+    return body.encode("utf-8"), "application/json"
+
+
+def check_format(response_format):
+    """Validate a ?format= value early, before any expensive work"""
+    response_format = (response_format or "full").lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    return response_format
+
+
+def render(request, result, fields=None, response_format=None):
+    """Apply the requested projection and encoding to an endpoint result"""
+    response_format = check_format(response_format)
+
+    if fields:
+        result = project(result, [f.strip() for f in fields.split(",") if f.strip()])
+    elif response_format == "compact":
+        result = project(result, COMPACT_FIELDS)
+
+    if wants_msgpack(request):
+        body, media_type = encode(result, use_msgpack=True)
+        return Response(content=body, media_type=media_type)
+    return JSONResponse(content=result)
+
+
+def choose_encoding(header):
+    """Pick br or gzip (in that order of preference) if the client accepts it"""
+    codings = parse_qvalues(header)
+    wildcard = codings.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if codings.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete (non-streaming) responses with
+    brotli or gzip. Streaming responses pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((k.decode("latin-1").lower(), v.decode("latin-1")) for k, v in scope["headers"])
+        coding = choose_encoding(headers.get("accept-encoding"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streaming response: don't buffer it, send as-is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            await self._send_complete(send, start_message, message.get("body", b""), coding)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_complete(self, send, start_message, body, coding):
+        headers = [(k, v) for k, v in start_message["headers"]]
+        names = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in headers}
+        content_type = names.get("content-type", "")
+        compressible = (
+            len(body) >= self.minimum_size
+            and "content-encoding" not in names
+            and any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+        )
+        if compressible:
+            body = compress(body, coding)
+            headers = [(k, v) for k, v in headers if k.decode("latin-1").lower() != "content-length"]
+            headers += [
+                (b"content-encoding", coding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+        await send(dict(start_message, headers=headers))
+        await send({"type": "http.response.body", "body": body})
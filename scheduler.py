@@ -0,0 +1,415 @@
+"""
+Admission control and fair scheduling for model calls.
+
+Every Gemini call goes through a ModelScheduler which provides:
+- a per-tenant (store / API key) token bucket, so one store cannot burn the
+  whole quota
+- weighted fair queueing across tenants, so a 200-photo walk from one store
+  interleaves with single audits from everyone else instead of blocking them
+- a priority lane: reference uploads and interactive audits are dispatched
+  before bulk work. Priority is client-declared, so each tenant may hold at
+  most TENANT_MAX_INTERACTIVE calls in that lane; the rest run as bulk
+- a global concurrency cap (and optional requests/minute cap) matched to the
+  upstream quota
+- per-tenant queue-wait metrics
+
+Tenant keys come from client headers (or the client IP), so per-tenant state
+is bounded: tenants with nothing queued or running and a full bucket are
+forgotten on a periodic sweep, and stats are kept for the most recently
+active TENANT_STATS_MAX tenants.
+
+Model calls are synchronous, so granted work runs in a thread pool and no
+longer blocks the event loop.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "4"))
+# Global upstream requests/minute; 0 disables the global bucket
+MODEL_RPM = float(os.getenv("MODEL_RPM", "0"))
+TENANT_RPM = float(os.getenv("TENANT_RPM", "30"))
+TENANT_BURST = float(os.getenv("TENANT_BURST", "10"))
+TENANT_MAX_QUEUED = int(os.getenv("TENANT_MAX_QUEUED", "200"))
+# Interactive calls (queued + running) per tenant; a person waits on one audit at a time
+TENANT_MAX_INTERACTIVE = int(os.getenv("TENANT_MAX_INTERACTIVE", "2"))
+# "store:42=2,store:7=0.5"; tenants not listed get weight 1
+TENANT_WEIGHTS = os.getenv("TENANT_WEIGHTS", "")
+
+# Tenants whose stats are kept for /admin/scheduler (least recently active dropped first)
+TENANT_STATS_MAX = int(os.getenv("TENANT_STATS_MAX", "1000"))
+
+WAIT_SAMPLES = 1000
+IDLE_SWEEP_SECONDS = 60.0
+
+
+class SchedulerFull(Exception):
+    """Raised when a tenant already has too many model calls queued"""
+
+
+def parse_weights(spec):
+    """Parse "tenant=weight,..." into a dict"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        tenant, weight = item.split("=", 1)
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens/second"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until one token is available (0 if available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class TenantStats:
+    """Counters and recent queue waits for one tenant"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.downgraded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record_wait(self, wait):
+        self.started += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.waits.append(wait)
+
+    def snapshot(self):
+        waits = sorted(self.waits)
+        to_ms = lambda value: None if value is None else round(value * 1000, 1)
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "downgraded": self.downgraded,
+            "queue_wait_ms": {
+                "mean": to_ms(self.total_wait / self.started) if self.started else None,
+                "p50": to_ms(_percentile(waits, 50)),
+                "p95": to_ms(_percentile(waits, 95)),
+                "p99": to_ms(_percentile(waits, 99)),
+                "max": to_ms(self.max_wait),
+            },
+        }
+
+
+class _Pending:
+    """A queued model call waiting for a slot"""
+
+    __slots__ = ("tenant", "priority", "start_tag", "finish_tag", "seq", "enqueued_at", "future")
+
+    def __init__(self, tenant, priority, start_tag, finish_tag, seq, enqueued_at, future):
+        self.tenant = tenant
+        self.priority = priority
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class ModelScheduler:
+    """Weighted fair, rate-limited, priority-aware gate in front of the model client"""
+
+    def __init__(self, max_concurrency=MODEL_MAX_CONCURRENCY, tenant_rpm=TENANT_RPM, tenant_burst=TENANT_BURST,
+                 global_rpm=MODEL_RPM, weights=None, max_queued_per_tenant=TENANT_MAX_QUEUED,
+                 max_interactive_per_tenant=TENANT_MAX_INTERACTIVE, max_tenant_stats=TENANT_STATS_MAX,
+                 clock=time.monotonic):
+        self.max_concurrency = max(1, max_concurrency)
+        self.tenant_rpm = tenant_rpm
+        self.tenant_burst = tenant_burst
+        self.weights = weights or {}
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.max_interactive_per_tenant = max_interactive_per_tenant
+        self.max_tenant_stats = max(1, max_tenant_stats)
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rpm / 60, max(1.0, global_rpm / 60), clock) if global_rpm else None
+
+        # priority -> tenant -> deque of _Pending, each lane fair-queued separately
+        self._queues = {INTERACTIVE: {}, BULK: {}}
+        self._virtual_time = {INTERACTIVE: 0.0, BULK: 0.0}
+        self._last_finish = {INTERACTIVE: {}, BULK: {}}
+        self._buckets = {}
+        self._stats = OrderedDict()
+        # tenant -> interactive calls queued or running
+        self._interactive = {}
+        # tenant -> calls granted a slot and not yet released
+        self._running = {}
+        self._in_flight = 0
+        self._last_sweep = clock()
+        self._seq = 0
+        self._timer = None
+        self._timer_at = None
+
+    def _bucket(self, tenant):
+        if not self.tenant_rpm:
+            return None
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(self.tenant_rpm / 60, self.tenant_burst, self.clock)
+        return bucket
+
+    def _tenant_stats(self, tenant):
+        stats = self._stats.get(tenant)
+        if stats is None:
+            stats = self._stats[tenant] = TenantStats()
+            if len(self._stats) > self.max_tenant_stats:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(tenant)
+        return stats
+
+    def _evict_idle(self, now):
+        """
+        Drop the bucket and fair-queueing tags of tenants with nothing queued
+        or running and a full bucket; if they come back they start with a
+        full bucket at the current virtual time, like any new tenant
+        """
+        self._last_sweep = now
+        tenants = set(self._buckets).union(*self._last_finish.values())
+        for tenant in tenants:
+            if self._running.get(tenant) or self.queued(tenant):
+                continue
+            bucket = self._buckets.get(tenant)
+            if bucket is not None and not bucket.full(now):
+                continue
+            self._buckets.pop(tenant, None)
+            for lane in self._last_finish.values():
+                lane.pop(tenant, None)
+
+    def queued(self, tenant=None):
+        """Number of calls waiting for a slot, optionally for one tenant"""
+        if tenant is None:
+            return sum(len(q) for lane in self._queues.values() for q in lane.values())
+        return sum(len(lane.get(tenant, ())) for lane in self._queues.values())
+
+    def _enqueue(self, tenant, priority):
+        now = self.clock()
+        if now - self._last_sweep >= IDLE_SWEEP_SECONDS:
+            self._evict_idle(now)
+        stats = self._tenant_stats(tenant)
+        if self.queued(tenant) >= self.max_queued_per_tenant:
+            stats.rejected += 1
+            raise SchedulerFull(f"Too many queued model calls for tenant {tenant}")
+        stats.submitted += 1
+
+        # Weighted fair queueing: each call costs 1/weight of virtual time
+        weight = self.weights.get(tenant, 1.0)
+        start_tag = max(self._virtual_time[priority], self._last_finish[priority].get(tenant, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self._last_finish[priority][tenant] = finish_tag
+
+        self._seq += 1
+        pending = _Pending(tenant, priority, start_tag, finish_tag, self._seq, now,
+                           asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(tenant, deque()).append(pending)
+        return pending
+
+    def _remove(self, pending):
+        queue = self._queues[pending.priority].get(pending.tenant)
+        if queue and pending in queue:
+            queue.remove(pending)
+            if not queue:
+                del self._queues[pending.priority][pending.tenant]
+
+    def _dispatch(self):
+        """Grant slots to the most deserving queued calls"""
+        now = self.clock()
+        next_wake = None
+
+        while self._in_flight < self.max_concurrency:
+            if self.global_bucket is not None:
+                wait = self.global_bucket.wait_time(now)
+                if wait > 0:
+                    next_wake = wait
+                    break
+
+            pick = None
+            for priority in (INTERACTIVE, BULK):
+                for tenant, queue in self._queues[priority].items():
+                    head = queue[0]
+                    bucket = self._bucket(tenant)
+                    wait = bucket.wait_time(now) if bucket else 0.0
+                    if wait > 0:
+                        next_wake = wait if next_wake is None else min(next_wake, wait)
+                        continue
+                    if pick is None or (head.finish_tag, head.seq) < (pick.finish_tag, pick.seq):
+                        pick = head
+                if pick is not None:
+                    break
+            if pick is None:
+                break
+
+            queue = self._queues[pick.priority][pick.tenant]
+            queue.popleft()
+            if not queue:
+                del self._queues[pick.priority][pick.tenant]
+            if pick.future.done():
+                # Caller was cancelled while queued; its cleanup hasn't run yet
+                continue
+            bucket = self._bucket(pick.tenant)
+            if bucket:
+                bucket.take(now)
+            if self.global_bucket is not None:
+                self.global_bucket.take(now)
+            self._virtual_time[pick.priority] = max(self._virtual_time[pick.priority], pick.start_tag)
+            self._in_flight += 1
+            self._running[pick.tenant] = self._running.get(pick.tenant, 0) + 1
+            pick.future.set_result(now - pick.enqueued_at)
+
+        if next_wake is not None and self.queued():
+            self._schedule_wake(next_wake)
+
+    def _schedule_wake(self, delay):
+        wake_at = self.clock() + delay
+        if self._timer is not None and self._timer_at <= wake_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = wake_at
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_at = None
+        self._dispatch()
+
+    def _release(self, tenant):
+        self._in_flight -= 1
+        self._running[tenant] -= 1
+        if not self._running[tenant]:
+            del self._running[tenant]
+        self._dispatch()
+
+    def _lane(self, tenant, priority):
+        """The lane a call actually joins: interactive only while the tenant is under its cap"""
+        if priority == INTERACTIVE and self._interactive.get(tenant, 0) >= self.max_interactive_per_tenant:
+            self._tenant_stats(tenant).downgraded += 1
+            return BULK
+        return priority
+
+    async def run(self, tenant, fn, *args, priority=BULK, **kwargs):
+        """
+        Queue a synchronous model call for `tenant` and run it in a worker
+        thread once the scheduler grants a slot. Raises SchedulerFull if the
+        tenant's queue is already at its limit.
+        """
+        priority = self._lane(tenant, priority)
+        pending = self._enqueue(tenant, priority)
+        if priority == INTERACTIVE:
+            self._interactive[tenant] = self._interactive.get(tenant, 0) + 1
+        try:
+            return await self._run_pending(pending, fn, args, kwargs)
+        finally:
+            if priority == INTERACTIVE:
+                self._interactive[tenant] -= 1
+                if not self._interactive[tenant]:
+                    del self._interactive[tenant]
+
+    async def _run_pending(self, pending, fn, args, kwargs):
+        self._dispatch()
+        tenant, priority = pending.tenant, pending.priority
+        stats = self._tenant_stats(tenant)
+
+        try:
+            wait = await pending.future
+        except asyncio.CancelledError:
+            if pending.future.done() and not pending.future.cancelled():
+                self._release(tenant)
+            else:
+                self._remove(pending)
+            raise
+        stats.record_wait(wait)
+        if wait > 1:
+            logger.info(f"Model call for {tenant} ({PRIORITY_NAMES[priority]}) waited {wait:.1f}s in queue")
+
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            stats.failed += 1
+            raise
+        finally:
+            self._release(tenant)
+        stats.completed += 1
+        return result
+
+    def metrics(self):
+        """Snapshot of scheduler state and per-tenant queue-wait metrics"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queued": {
+                PRIORITY_NAMES[priority]: sum(len(q) for q in lane.values())
+                for priority, lane in self._queues.items()
+            },
+            "tenant_rpm": self.tenant_rpm,
+            "tenant_burst": self.tenant_burst,
+            "max_interactive_per_tenant": self.max_interactive_per_tenant,
+            "tenants": {
+                tenant: dict(stats.snapshot(), queued=self.queued(tenant), interactive=self._interactive.get(tenant, 0),
+                             weight=self.weights.get(tenant, 1.0))
+                for tenant, stats in sorted(self._stats.items())
+            },
+        }
+
+
+def build_scheduler():
+    """Create the scheduler configured by the MODEL_* / TENANT_* environment variables"""
+    scheduler = ModelScheduler(weights=parse_weights(TENANT_WEIGHTS))
+    logger.info(f"Model scheduler: {scheduler.max_concurrency} concurrent calls, "
+                f"{TENANT_RPM:g} rpm/tenant (burst {TENANT_BURST:g}), global rpm {MODEL_RPM or 'unlimited'}")
+    return scheduler
@@ -0,0 +1,26 @@
+"""
+Fairness simulation for the model scheduler
+
+Runs the scheduler checks in test_scheduler.py, which replay skewed
+workloads against scheduler.ModelScheduler and check that:
+1. a store flooding the queue does not starve the other stores
+2. the priority lane jumps ahead of queued bulk work
+3. a store labelling its bulk walk "interactive" cannot hold the priority lane
+4. weights shift the share of capacity between stores
+5. the per-store token bucket caps how fast one store is served
+6. a full per-store queue is rejected (429) and cancelled calls never run
+
+Exits non-zero if any check fails. The same checks run as part of
+`python -m pytest`.
+
+Usage:
+    python simulate_fairness.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-v", str(Path(__file__).with_name("test_scheduler.py"))]))
@@ -1,71 +1,96 @@
 """
 Test script for Shelf-Eye Agent API
+
+By default runs against the in-process app with the model client in replay
+mode (see model_harness.py), so no server or Gemini quota is needed:
+
+    python test_api.py
+    python -m pytest test_api.py
+
+Pass --url to test a running server instead:
+
+    python test_api.py --url http://localhost:8080 --image "wrong order.png"
 """
 
-import requests
-import json
+import argparse
 from pathlib import Path
 
-# API endpoint
-API_URL = "http://localhost:8080"
+import httpx
+
+DEFAULT_IMAGE = Path(__file__).resolve().parent / "wrong order.png"
 
-def test_health_check():
+
+def test_health_check(client):
     """Test the health check endpoint"""
     print("🏥 Testing health check...")
-    response = requests.get(f"{API_URL}/health")
+    response = client.get("/health")
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
+
 
-def test_get_standards():
-    """Test getting reference standards"""
-    print("📋 Testing reference standards endpoint...")
-    response = requests.get(f"{API_URL}/standards")
+def test_list_references(client):
+    """Test listing the stored reference versions"""
+    print("📋 Testing reference versions endpoint...")
+    response = client.get("/admin/references")
     print(f"Status: {response.status_code}")
-    print(f"Standards: {json.dumps(response.json(), indent=2)}")
+    print(f"References: {response.json()}")
     print()
+    assert response.status_code == 200
+    assert "versions" in response.json()
+
 
-def test_audit_shelf(image_path):
+def test_audit_shelf(client, image_path=DEFAULT_IMAGE):
     """Test shelf audit with an image"""
     print(f"🔍 Testing shelf audit with image: {image_path}")
-    
-    if not Path(image_path).exists():
-        print(f"❌ Error: Image not found at {image_path}")
-        return
-    
-    with open(image_path, 'rb') as f:
-        files = {'file': f}
-        response = requests.post(f"{API_URL}/audit", files=files)
-    
+    assert Path(image_path).exists(), f"Image not found at {image_path}"
+
+    with open(image_path, "rb") as f:
+        response = client.post("/audit", files={"file": (Path(image_path).name, f, "image/png")})
+
     print(f"Status: {response.status_code}")
-    
-    if response.status_code == 200:
-        result = response.json()
-        print(f"✅ Success!")
-        print(f"Timestamp: {result['timestamp']}")
-        print(f"Section: {result['reference_section']}")
-        print(f"\n📊 Analysis Results:\n")
-        print(result['analysis'])
-    else:
-        print(f"❌ Error: {response.text}")
+    assert response.status_code == 200, response.text
+
+    result = response.json()
+    print(f"✅ Success!")
+    print(f"Timestamp: {result['timestamp']}")
+    print(f"Compliance: {result['compliance_status']} (reference version: {result['reference_version']})")
+    print(f"\n📊 Analysis Results:\n")
+    print(result["analysis"])
     print()
+    assert result["status"] == "success"
+    assert result["analysis"]
+
+
+def replay_client():
+    """In-process client for the app in replay mode"""
+    from fastapi.testclient import TestClient
+
+    from benchmark import load_app
+
+    return TestClient(load_app("0"))
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shelf-Eye Agent API smoke test")
+    parser.add_argument("--url", help="Test a running server instead of the in-process replay app")
+    parser.add_argument("--image", default=str(DEFAULT_IMAGE), help="Shelf image used for /audit")
+    args = parser.parse_args()
+    image = str(Path(args.image).resolve())
+
     print("=" * 60)
     print("🛒 Shelf-Eye Agent - API Test Suite")
     print("=" * 60)
     print()
-    
-    # Test health check
-    test_health_check()
-    
-    # Test standards endpoint
-    test_get_standards()
-    
-    # Test shelf audit (you need to provide an image path)
-    # Uncomment and update the path below to test with an actual image
-    # test_audit_shelf("path/to/your/shelf-image.jpg")
-    
+
+    client = httpx.Client(base_url=args.url, timeout=120) if args.url else replay_client()
+    with client:
+        test_health_check(client)
+        test_list_references(client)
+        test_audit_shelf(client, image)
+
     print("=" * 60)
     print("✅ Test suite completed!")
     print("=" * 60)
@@ -0,0 +1,138 @@
+"""
+Tests for the audit log and its Arrow / Parquet export
+"""
+
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from audit_export import AUDIT_SCHEMA, export_audits, parse_time
+from audit_log import AuditLog, build_record, extract_missing_products, extract_price_deviations
+from benchmark import DEFAULT_IMAGE
+
+ANALYSIS = """✓ Coca-Cola Classic 500ml: $3.49 - Present
+✓ Pepsi 500ml: $2.99 - Present
+<span style="color: red;">❌ MISSING: Mountain Dew Original 500ml Bottle</span>
+• Overall Compliance: 72/100"""
+STANDARD_PRICES = {"Coca-Cola": {"500ml": 2.99}, "Pepsi": {"500ml": 2.99}}
+
+
+def record(timestamp, store="1", section="Beverages"):
+    result = {
+        "timestamp": timestamp.isoformat(),
+        "filename": "shelf.jpg",
+        "compliance_status": "issues",
+        "has_reference": True,
+        "reference_version": "0123456789abcdef",
+        "scores": {"position_match": 80.0, "stock_completeness": None,
+                   "overall_compliance": 72.0, "overall_match_pct": None},
+    }
+    return build_record(result, ANALYSIS, store, section, STANDARD_PRICES)
+
+
+def read_export(audit_log, export_format, **filters):
+    data = b"".join(export_audits(audit_log, export_format, **filters))
+    if export_format == "parquet":
+        return pq.read_table(io.BytesIO(data))
+    return pa.ipc.open_stream(data).read_all()
+
+
+@pytest.fixture
+def audit_log(tmp_path):
+    log = AuditLog(str(tmp_path / "audit_log"))
+    day = datetime(2026, 10, 1, 9, 0)
+    for index in range(10):
+        log.append(record(day + timedelta(days=index % 3, minutes=index),
+                          store=str(index % 2), section=("Beverages", "Snacks")[index % 2]))
+    return log
+
+
+def test_extractors():
+    assert extract_missing_products(ANALYSIS) == ["Mountain Dew Original 500ml Bottle"]
+    assert extract_price_deviations(ANALYSIS, STANDARD_PRICES) == [
+        {"product": "Coca-Cola Classic 500ml", "observed": 3.49, "standard": 2.99, "deviation": 0.5}
+    ]
+
+
+def test_log_is_partitioned_by_day(audit_log):
+    assert len(audit_log.files()) == 3
+    assert len(audit_log.files(start=datetime(2026, 10, 2), end=datetime(2026, 10, 2, 23))) == 1
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_round_trip(audit_log, export_format):
+    table = read_export(audit_log, export_format)
+    assert table.schema.equals(AUDIT_SCHEMA)
+    assert table.num_rows == 10
+    row = table.slice(0, 1).to_pylist()[0]
+    assert row["timestamp"] == datetime(2026, 10, 1, 9, 0)
+    assert row["store"] == "0"
+    assert row["overall_compliance"] == 72.0
+    assert row["stock_completeness"] is None
+    assert row["missing_products"] == ["Mountain Dew Original 500ml Bottle"]
+    assert row["price_deviations"][0]["product"] == "Coca-Cola Classic 500ml"
+
+
+def test_parquet_row_group_per_batch(audit_log):
+    data = b"".join(export_audits(audit_log, "parquet", batch_size=4))
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+
+
+def test_filters(audit_log):
+    assert read_export(audit_log, "arrow", store="1").num_rows == 5
+    assert read_export(audit_log, "arrow", store="1", section="Beverages").num_rows == 0
+    assert read_export(audit_log, "arrow", section="Snacks").num_rows == 5
+
+    day_two = read_export(audit_log, "arrow", start=parse_time("2026-10-02"),
+                          end=parse_time("2026-10-02", end_of_day=True))
+    assert day_two.num_rows == 3
+    assert read_export(audit_log, "arrow", start=parse_time("2030-01-01")).num_rows == 0
+
+
+def test_unreadable_lines_are_skipped(audit_log, caplog):
+    path = audit_log.files()[-1]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"timestamp": "2026-10-03T09:30:00", "store": "1", "sec\n')
+        f.write('{"store": "1"}\n')
+        f.write('[]\n')
+    with caplog.at_level("WARNING", logger="audit_export"):
+        table = read_export(audit_log, "parquet")
+    assert table.num_rows == 10
+    assert "Skipped 3 unreadable audit log line(s)" in caplog.text
+
+
+def test_time_filters_with_utc_offset(audit_log):
+    # Audit timestamps are naive local time; an aware bound must mean the same instant
+    local_start = datetime(2026, 10, 2, 0, 0)
+    aware_start = local_start.astimezone(timezone.utc).isoformat()
+    expected = read_export(audit_log, "arrow", start=local_start).num_rows
+    assert read_export(audit_log, "arrow", start=parse_time(aware_start)).num_rows == expected == 6
+
+
+def test_export_endpoint(client):
+    store = uuid.uuid4().hex[:8]
+    image = DEFAULT_IMAGE.read_bytes()
+    for section in ("Beverages", "Snacks"):
+        response = client.post("/audit", headers={"X-Store-Id": store}, data={"section": section},
+                               files={"file": ("shelf.png", image, "image/png")})
+        assert response.status_code == 200
+
+    response = client.get("/admin/export", params={"format": "parquet", "store": store},
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert "content-encoding" not in response.headers
+    table = pq.read_table(io.BytesIO(response.content))
+    assert sorted(table.column("section").to_pylist()) == ["Beverages", "Snacks"]
+
+    response = client.get("/admin/export", params={"store": store, "section": "Snacks"})
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 1
+
+
+@pytest.mark.parametrize("params", [{"format": "csv"}, {"start": "yesterday"}, {"batch_size": 0}])
+def test_export_endpoint_rejects_bad_parameters(client, params):
+    assert client.get("/admin/export", params=params).status_code in (400, 422)
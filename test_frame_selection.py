@@ -0,0 +1,126 @@
+"""
+Tests for burst/video frame scoring and ranking
+"""
+
+import asyncio
+import os
+import signal
+
+import cv2
+import numpy as np
+
+from benchmark import DEFAULT_IMAGE, make_burst
+from frame_selection import (MIN_SHARPNESS, get_pool, rank_frames, score_image_bytes, score_video_bytes,
+                             select_frames, shutdown_pool)
+
+
+def make_clip(path, size=9):
+    """Write the synthetic burst as a short MP4 clip; frame size // 2 is the sharp one"""
+    frames = [cv2.resize(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR), (640, 480))
+              for data in make_burst(DEFAULT_IMAGE, size)]
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (640, 480))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path.read_bytes()
+
+
+def metrics(sharpness, exposure=0.9, coverage=0.8):
+    return {"sharpness": sharpness, "exposure": exposure, "coverage": coverage}
+
+
+def test_rank_frames_prefers_sharpest_frame():
+    scored, selected = rank_frames([metrics(120.0), metrics(480.0), metrics(240.0)])
+    assert selected == [1]
+    assert [s["index"] for s in scored] == [0, 1, 2]
+    assert scored[1]["score"] > scored[2]["score"] > scored[0]["score"]
+
+
+def test_rank_frames_returns_best_first_up_to_max_frames():
+    _, selected = rank_frames([metrics(120.0), metrics(480.0), metrics(240.0)], max_frames=2)
+    assert selected == [1, 2]
+
+
+def test_rank_frames_skips_unreadable_and_unusable_frames():
+    dark = metrics(900.0, exposure=0.05)
+    _, selected = rank_frames([None, dark, metrics(200.0)])
+    assert selected == [2]
+
+
+def test_rank_frames_falls_back_when_nothing_is_usable():
+    blurry = [metrics(MIN_SHARPNESS / 4), metrics(MIN_SHARPNESS / 2)]
+    _, selected = rank_frames(blurry)
+    assert selected == [1]
+    assert rank_frames([None, None]) == ([], [])
+
+
+def test_scoring_picks_the_sharp_frame_of_a_burst():
+    frames = make_burst(DEFAULT_IMAGE, 5)
+    _, selected = rank_frames([score_image_bytes(data) for data in frames])
+    assert selected == [2]
+    assert score_image_bytes(b"not an image") is None
+
+
+def test_select_frames_uses_worker_pool():
+    frames = make_burst(DEFAULT_IMAGE, 3)
+    try:
+        selected, report = asyncio.run(select_frames([(data, "image/jpeg") for data in frames]))
+    finally:
+        shutdown_pool()
+    assert len(selected) == 1
+    assert selected[0][0] == frames[1]
+    assert report["selected_frames"] == [1]
+
+
+def test_select_frames_recovers_from_killed_worker():
+    frames = [(data, "image/jpeg") for data in make_burst(DEFAULT_IMAGE, 3)]
+
+    async def scenario():
+        await select_frames(frames)
+        broken = get_pool()
+        # What an OOM kill during a large video decode looks like to the pool
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        selected, report = await select_frames(frames)
+        assert get_pool() is not broken
+        return report
+
+    try:
+        report = asyncio.run(scenario())
+    finally:
+        shutdown_pool()
+    assert report["selected_frames"] == [1]
+
+
+def test_score_video_bytes_samples_evenly_spaced_frames(tmp_path):
+    clip = make_clip(tmp_path / "clip.mp4")
+    sampled = score_video_bytes(clip, sample_frames=5)
+    assert [scores["source_frame"] for scores, _ in sampled] == [0, 2, 4, 6, 8]
+    assert all(score_image_bytes(jpeg) is not None for _, jpeg in sampled)
+    assert score_video_bytes(b"not a video") == []
+
+
+def test_select_frames_from_video(tmp_path):
+    clip = make_clip(tmp_path / "clip.mp4")
+    try:
+        selected, report = asyncio.run(select_frames([(clip, "video/mp4")], max_frames=2))
+    finally:
+        shutdown_pool()
+    assert report["source"] == "video"
+    assert report["frames_received"] == 9
+    assert [s["source_frame"] for s in report["scores"]] == list(range(9))
+    assert len(selected) == len(report["selected_frames"]) == 2
+    assert report["selected_frames"][0] == 4
+    assert all(content_type == "image/jpeg" for _, content_type in selected)
+
+
+def test_audit_with_video(client, tmp_path):
+    clip = make_clip(tmp_path / "clip.mp4")
+    response = client.post("/audit", data={"max_frames": "1"},
+                           files={"file": ("clip.mp4", clip, "video/mp4")})
+    assert response.status_code == 200
+    report = response.json()["frame_selection"]
+    assert report["source"] == "video"
+    assert report["selected_frames"] == [4]
+    assert report["scores"][4]["source_frame"] == 4
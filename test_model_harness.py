@@ -0,0 +1,115 @@
+"""
+Tests for the record/replay model harness, using a fake live client
+"""
+
+import json
+
+import pytest
+from google.genai import types
+
+import model_harness
+from model_harness import FixtureNotFound, RecordReplayClient, hash_contents, parse_latency
+
+MODEL = "gemini-2.0-flash"
+PROMPT = "List every product on this shelf."
+SHELF = types.Part.from_bytes(data=b"shelf image bytes", mime_type="image/jpeg")
+OTHER_SHELF = types.Part.from_bytes(data=b"another shelf", mime_type="image/jpeg")
+
+
+class FakeLiveClient:
+    """Stands in for genai.Client: answers with a numbered text and counts calls"""
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self):
+        self.calls = []
+        self.models = self
+
+    def generate_content(self, model, contents, **kwargs):
+        self.calls.append((model, contents))
+        return self._Response(f"analysis #{len(self.calls)}")
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """Fixtures dir holding one recorded call for PROMPT + SHELF"""
+    live = FakeLiveClient()
+    recorder = RecordReplayClient(live, mode="record", fixtures_dir=str(tmp_path))
+    response = recorder.models.generate_content(model=MODEL, contents=[PROMPT, SHELF])
+    assert len(live.calls) == 1
+    return tmp_path, response.text
+
+
+def test_record_then_replay_returns_the_same_text(recorded):
+    fixtures_dir, text = recorded
+    replay = RecordReplayClient(mode="replay", fixtures_dir=str(fixtures_dir))
+    assert replay.models.generate_content(model=MODEL, contents=[PROMPT, SHELF]).text == text == "analysis #1"
+    assert replay.calls == 1
+
+    key, prompt_sha, image_sha = hash_contents(MODEL, [PROMPT, SHELF])
+    fixture = json.loads((fixtures_dir / f"{key}.json").read_text())
+    assert fixture["text"] == text
+    assert (fixture["prompt_sha256"], fixture["image_sha256"]) == (prompt_sha, image_sha)
+    assert fixture["latency_ms"] >= 0
+
+
+def test_replay_miss_raises_without_fallback(recorded):
+    fixtures_dir, _ = recorded
+    replay = RecordReplayClient(mode="replay", fixtures_dir=str(fixtures_dir))
+    with pytest.raises(FixtureNotFound):
+        replay.models.generate_content(model=MODEL, contents=[PROMPT, OTHER_SHELF])
+    with pytest.raises(FixtureNotFound):
+        replay.models.generate_content(model="gemini-1.5-pro", contents=[PROMPT, SHELF])
+
+    fallback = RecordReplayClient(mode="replay", fixtures_dir=str(fixtures_dir), fallback_text="fallback")
+    assert fallback.models.generate_content(model=MODEL, contents=[PROMPT, OTHER_SHELF]).text == "fallback"
+
+
+def test_hash_contents_keys_on_model_prompt_and_image():
+    key = hash_contents(MODEL, [PROMPT, SHELF])[0]
+    # A prompt passed as a text Part hashes like the plain string
+    assert hash_contents(MODEL, [types.Part.from_text(text=PROMPT), SHELF])[0] == key
+    assert hash_contents(MODEL, [PROMPT + " ", SHELF])[0] != key
+    assert hash_contents(MODEL, [PROMPT, OTHER_SHELF])[0] != key
+    assert hash_contents("gemini-1.5-pro", [PROMPT, SHELF])[0] != key
+    png = types.Part.from_bytes(data=b"shelf image bytes", mime_type="image/png")
+    assert hash_contents(MODEL, [PROMPT, png])[0] != key
+
+
+@pytest.mark.parametrize("spec, expected", [
+    (None, None),
+    ("", None),
+    ("recorded", "recorded"),
+    ("1200", (1200.0, 1200.0)),
+    ("800-2000", (800.0, 2000.0)),
+])
+def test_parse_latency(spec, expected):
+    assert parse_latency(spec) == expected
+
+
+@pytest.mark.parametrize("latency, expected_ms", [("recorded", 1500), ("250", 250)])
+def test_replay_latency(recorded, monkeypatch, latency, expected_ms):
+    fixtures_dir, _ = recorded
+    key = hash_contents(MODEL, [PROMPT, SHELF])[0]
+    path = fixtures_dir / f"{key}.json"
+    path.write_text(json.dumps(dict(json.loads(path.read_text()), latency_ms=expected_ms)))
+    sleeps = []
+    monkeypatch.setattr(model_harness.time, "sleep", sleeps.append)
+
+    replay = RecordReplayClient(mode="replay", fixtures_dir=str(fixtures_dir), latency=latency)
+    replay.models.generate_content(model=MODEL, contents=[PROMPT, SHELF])
+    assert sleeps == [expected_ms / 1000]
+
+
+def test_live_mode_passes_through(tmp_path):
+    live = FakeLiveClient()
+    client = RecordReplayClient(live, mode="live", fixtures_dir=str(tmp_path))
+    assert client.models.generate_content(model=MODEL, contents=[PROMPT, SHELF]).text == "analysis #1"
+    assert not list(tmp_path.iterdir())
+
+    with pytest.raises(ValueError):
+        RecordReplayClient(mode="record")
+    with pytest.raises(ValueError):
+        RecordReplayClient(live, mode="playback")
@@ -0,0 +1,174 @@
+"""
+Tests for the versioned reference store: activation order, pruning and
+pinned versions (directly and through /audit in replay mode)
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from benchmark import DEFAULT_IMAGE, DEFAULT_REFERENCE_IMAGE
+from reference_store import ReferenceNotFound, ReferenceStore
+
+
+async def settle(store):
+    """Wait for every background analysis to finish"""
+    while store._tasks:
+        await asyncio.gather(*list(store._tasks))
+
+
+async def fast_analysis(data, mime_type):
+    return {"layout": data.decode()}
+
+
+def test_older_slower_upload_does_not_override_newer(tmp_path):
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"))
+        release_old = asyncio.Event()
+
+        async def slow_analysis(data, mime_type):
+            await release_old.wait()
+            return {"layout": "old"}
+
+        old = await store.submit(b"old", "image/png", "old.png", slow_analysis)
+        new = await store.submit(b"new", "image/png", "new.png", fast_analysis)
+        while new["status"] != "ready":
+            await asyncio.sleep(0.01)
+        assert store.active_version() == new["version"]
+
+        release_old.set()
+        await settle(store)
+        assert old["status"] == "ready"
+        assert store.active_version() == new["version"]
+        # The older version is still stored and can be activated explicitly
+        store.activate(old["version"])
+        assert store.active_version() == old["version"]
+
+    asyncio.run(scenario())
+
+
+def test_same_image_reuses_version_without_analysis(tmp_path):
+    calls = []
+
+    async def counting_analysis(data, mime_type):
+        calls.append(data)
+        return {"layout": "x"}
+
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"))
+        first = await store.submit(b"shelf", "image/png", "a.png", counting_analysis)
+        await settle(store)
+        second = await store.submit(b"shelf", "image/png", "b.png", counting_analysis)
+        assert second["status"] == "ready"
+        assert second["version"] == first["version"]
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_prune_keeps_active_plus_history(tmp_path):
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"), history=2)
+        jobs = []
+        for index in range(4):
+            jobs.append(await store.submit(f"image {index}".encode(), "image/png", f"{index}.png", fast_analysis))
+            await settle(store)
+        versions = [v["version"] for v in store.list_versions()]
+        assert len(versions) == 2
+        assert store.active_version() == jobs[-1]["version"]
+        assert set(versions) == {jobs[-1]["version"], jobs[-2]["version"]}
+
+    asyncio.run(scenario())
+
+
+def test_prune_never_removes_version_being_analyzed(tmp_path):
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"), history=1)
+        release = asyncio.Event()
+
+        async def gated_analysis(data, mime_type):
+            await release.wait()
+            return {"layout": "gated"}
+
+        gated = await store.submit(b"gated", "image/png", "gated.png", gated_analysis)
+        for index in range(3):
+            await store.submit(f"image {index}".encode(), "image/png", f"{index}.png", fast_analysis)
+            await asyncio.sleep(0.01)
+        assert gated["version"] in [v["version"] for v in store.list_versions()]
+
+        release.set()
+        await settle(store)
+        assert gated["status"] == "ready", gated["error"]
+        assert not store._busy
+
+    asyncio.run(scenario())
+
+
+def test_get_layout_pinned_and_unknown_versions(tmp_path):
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"))
+        assert store.get_layout() == (None, None)
+        first = await store.submit(b"first", "image/png", "1.png", fast_analysis)
+        await settle(store)
+        second = await store.submit(b"second", "image/png", "2.png", fast_analysis)
+        await settle(store)
+
+        assert store.get_layout()[0] == second["version"]
+        version, layout = store.get_layout(first["version"])
+        assert version == first["version"]
+        assert layout["layout"] == "first"
+        with pytest.raises(ReferenceNotFound):
+            store.get_layout("0123456789abcdef")
+        with pytest.raises(ReferenceNotFound):
+            store.get_layout("../../etc/passwd")
+
+    asyncio.run(scenario())
+
+
+def test_active_pointer_is_read_once_and_kept_in_memory(tmp_path, monkeypatch):
+    async def scenario():
+        store = ReferenceStore(str(tmp_path / "ref"))
+        job = await store.submit(b"shelf", "image/png", "shelf.png", fast_analysis)
+        await settle(store)
+        return job["version"]
+
+    version = asyncio.run(scenario())
+    restarted = ReferenceStore(str(tmp_path / "ref"))
+    assert restarted.active_version() == version
+
+    # Audits resolve the active reference without any file I/O
+    def no_disk(*args, **kwargs):
+        raise AssertionError("active reference was read from disk")
+
+    monkeypatch.setattr("builtins.open", no_disk)
+    assert restarted.get_layout() == (version, {"layout": "shelf", "version": version})
+
+
+def wait_for_job(client, status_url, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job["status"] in ("ready", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job at {status_url} did not finish")
+
+
+def test_audit_with_pinned_reference_version(client):
+    with open(DEFAULT_REFERENCE_IMAGE, "rb") as f:
+        response = client.post("/admin/upload-reference", files={"file": ("ref.png", f.read(), "image/png")})
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["status_url"])
+    assert job["status"] == "ready", job["error"]
+
+    image = DEFAULT_IMAGE.read_bytes()
+    pinned = client.post("/audit", files={"file": ("shelf.png", image, "image/png")},
+                         data={"reference_version": job["version"]})
+    assert pinned.status_code == 200
+    assert pinned.json()["reference_version"] == job["version"]
+    assert pinned.json()["has_reference"] is True
+
+    unknown = client.post("/audit", files={"file": ("shelf.png", image, "image/png")},
+                          data={"reference_version": "0123456789abcdef"})
+    assert unknown.status_code == 404
@@ -0,0 +1,126 @@
+"""
+Tests for response shaping: field projection, Accept negotiation and the
+compression middleware
+"""
+
+import json
+
+import msgpack
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from benchmark import DEFAULT_IMAGE
+from response_format import CompressionMiddleware, choose_encoding, extract_scores, project, wants_msgpack
+
+
+class FakeRequest:
+    def __init__(self, accept=None):
+        self.headers = {"accept": accept} if accept is not None else {}
+
+
+def test_project_keeps_top_level_and_dotted_fields():
+    result = {
+        "status": "success",
+        "analysis": "long report",
+        "frame_selection": {"selected_frames": [2], "frames": [{"index": 2, "score": 0.9}]},
+    }
+    projected = project(result, ["status", "frame_selection.selected_frames", "missing", "analysis.nested"])
+    assert projected == {"status": "success", "frame_selection": {"selected_frames": [2]}}
+
+
+def test_extract_scores():
+    scores = extract_scores("• Position Match Score: 80/100\n• **Overall Compliance:** 72/100\n• Overall Match: 75%")
+    assert scores == {"position_match": 80.0, "stock_completeness": None,
+                      "overall_compliance": 72.0, "overall_match_pct": 75.0}
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("*/*", False),
+    ("application/json", False),
+    ("application/msgpack", True),
+    ("application/msgpack, */*", True),
+    ("application/json, application/msgpack;q=0", False),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("application/json;q=0.5, application/x-msgpack", True),
+    ("application/msgpack; q=0.9, application/json; charset=utf-8; q=0.8", True),
+])
+def test_wants_msgpack_honours_q_values(accept, expected):
+    assert wants_msgpack(FakeRequest(accept)) is expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+@pytest.fixture
+def compressed_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    payload = {"items": [f"product {i}" for i in range(200)]}
+
+    @app.get("/large")
+    def large():
+        return JSONResponse(payload)
+
+    @app.get("/small")
+    def small():
+        return JSONResponse({"ok": True})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"chunk-1;", b"chunk-2;", b"chunk-3"]), media_type="text/plain")
+
+    with TestClient(app) as test_client:
+        yield test_client, payload
+
+
+@pytest.mark.parametrize("coding", ["gzip", "br"])
+def test_complete_responses_are_compressed(compressed_app, coding):
+    test_client, payload = compressed_app
+    response = test_client.get("/large", headers={"Accept-Encoding": coding})
+    assert response.headers["content-encoding"] == coding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(json.dumps(payload))
+    assert response.json() == payload
+
+
+def test_small_responses_are_not_compressed(compressed_app):
+    test_client, _ = compressed_app
+    response = test_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+
+def test_streaming_responses_pass_through(compressed_app):
+    test_client, _ = compressed_app
+    response = test_client.get("/stream", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"chunk-1;chunk-2;chunk-3"
+
+
+def test_compact_msgpack_audit(client):
+    response = client.post("/audit?format=compact", headers={"Accept": "application/msgpack"},
+                           files={"file": ("shelf.png", DEFAULT_IMAGE.read_bytes(), "image/png")})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    result = msgpack.unpackb(response.content)
+    assert "analysis" not in result
+    assert result["status"] == "success"
+    assert set(result["scores"]) == {"position_match", "stock_completeness", "overall_compliance",
+                                     "overall_match_pct"}
+
+
+def test_unknown_format_is_rejected(client):
+    response = client.post("/audit?format=tiny", files={"file": ("shelf.png", DEFAULT_IMAGE.read_bytes(), "image/png")})
+    assert response.status_code == 400
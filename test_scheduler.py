@@ -0,0 +1,231 @@
+"""
+Tests for the model scheduler: fair queueing, the priority lane and its
+per-tenant cap, token buckets, weights, queue limits and cancellation.
+
+Most checks run with max_concurrency=1 and record the order in which calls
+are granted, and the token bucket runs on a fake clock, so the results do
+not depend on wall-clock timing.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from benchmark import DEFAULT_IMAGE
+from scheduler import BULK, IDLE_SWEEP_SECONDS, INTERACTIVE, ModelScheduler, SchedulerFull, parse_weights
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def serial_scheduler(**kwargs):
+    """One slot, no rate limit: calls run one at a time in grant order"""
+    kwargs.setdefault("tenant_rpm", 0)
+    kwargs.setdefault("max_queued_per_tenant", 1000)
+    return ModelScheduler(max_concurrency=1, **kwargs)
+
+
+async def run_all(scheduler, calls):
+    """Submit (tenant, priority) calls in order and return tenants in the order their calls ran"""
+    order = []
+    await asyncio.gather(*(scheduler.run(tenant, order.append, tenant, priority=priority)
+                           for tenant, priority in calls))
+    return order
+
+
+async def wait_until(predicate, timeout=5.0):
+    # Granted calls run in executor threads, so give them real time to finish
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "scheduler did not make progress"
+        await asyncio.sleep(0.005)
+
+
+def test_parse_weights():
+    assert parse_weights("store:42=2, store:7=0.5,bogus") == {"store:42": 2.0, "store:7": 0.5}
+    assert parse_weights("") == {}
+
+
+def test_heavy_store_does_not_starve_light_stores():
+    heavy = [("heavy", BULK)] * 20
+    light = [(f"light-{index}", BULK) for index in range(3) for _ in range(2)]
+
+    fair = asyncio.run(run_all(serial_scheduler(), heavy + light))
+    light_positions = [index for index, tenant in enumerate(fair) if tenant != "heavy"]
+    # Light stores start at the current virtual time and interleave with the backlog
+    assert max(light_positions) < 10
+    # ...while the heavy store keeps its share and finishes its walk
+    assert fair.count("heavy") == 20
+
+
+def test_priority_lane_jumps_queued_bulk_work():
+    order = asyncio.run(run_all(serial_scheduler(), [("heavy", BULK)] * 10 + [("admin", INTERACTIVE)]))
+    # Only the bulk call already holding the slot runs first
+    assert order.index("admin") == 1
+
+
+def test_interactive_cap_downgrades_a_flood():
+    async def scenario():
+        scheduler = serial_scheduler(max_interactive_per_tenant=2)
+        order = await run_all(scheduler, [("heavy", INTERACTIVE)] * 10 + [("store-1", INTERACTIVE)])
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    # heavy keeps two interactive calls; store-1's earlier finish tag puts it right after the first
+    assert order.index("store-1") == 1
+    tenants = scheduler.metrics()["tenants"]
+    assert tenants["heavy"]["downgraded"] == 8
+    assert tenants["store-1"]["downgraded"] == 0
+    assert tenants["heavy"]["interactive"] == 0
+
+
+def test_weights_shift_share_of_capacity():
+    scheduler = serial_scheduler(weights={"big": 3.0})
+    order = asyncio.run(run_all(scheduler, [("big", BULK), ("small", BULK)] * 40))
+    assert order[:40].count("big") == 30
+
+
+def test_token_bucket_limits_rate_on_fake_clock():
+    async def scenario():
+        clock = FakeClock()
+        scheduler = ModelScheduler(max_concurrency=4, tenant_rpm=600, tenant_burst=5, clock=clock)
+        done = []
+        tasks = [asyncio.ensure_future(scheduler.run("store-1", done.append, 1)) for _ in range(20)]
+
+        await wait_until(lambda: len(done) == 5)
+        await asyncio.sleep(0.15)
+        assert len(done) == 5, "calls beyond the burst ran before any tokens refilled"
+        assert scheduler.queued("store-1") == 15
+
+        # 10 tokens/second: half a second refills five tokens, picked up by the wake-up timer
+        clock.advance(0.5)
+        await wait_until(lambda: len(done) == 10)
+        await asyncio.sleep(0.15)
+        assert len(done) == 10
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert scheduler.queued() == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_is_measured_on_the_scheduler_clock():
+    async def scenario():
+        clock = FakeClock()
+        scheduler = ModelScheduler(max_concurrency=1, tenant_rpm=0, clock=clock)
+        release = threading.Event()
+        first = asyncio.ensure_future(scheduler.run("store-1", release.wait, 5))
+        second = asyncio.ensure_future(scheduler.run("store-1", lambda: None))
+        await wait_until(lambda: scheduler.queued() == 1)
+        clock.advance(2.0)
+        release.set()
+        await asyncio.gather(first, second)
+        return scheduler.metrics()["tenants"]["store-1"]
+
+    stats = asyncio.run(scenario())
+    assert stats["completed"] == 2
+    assert stats["queue_wait_ms"]["max"] == 2000.0
+
+
+def test_full_queue_rejects_with_scheduler_full():
+    async def scenario():
+        scheduler = ModelScheduler(max_concurrency=1, tenant_rpm=0, max_queued_per_tenant=3)
+        release = threading.Event()
+        # One call holds the slot, three more fill the tenant's queue
+        tasks = [asyncio.ensure_future(scheduler.run("store-1", release.wait, 5)) for _ in range(4)]
+        await wait_until(lambda: scheduler.queued("store-1") == 3)
+
+        with pytest.raises(SchedulerFull):
+            await scheduler.run("store-1", release.wait, 5)
+        other = asyncio.ensure_future(scheduler.run("store-2", lambda: "ok"))
+        release.set()
+        assert await other == "ok"
+        await asyncio.gather(*tasks)
+        return scheduler.metrics()["tenants"]
+
+    tenants = asyncio.run(scenario())
+    assert tenants["store-1"]["rejected"] == 1
+    assert tenants["store-1"]["completed"] == 4
+    assert tenants["store-2"]["completed"] == 1
+
+
+def test_cancelled_queued_call_never_runs():
+    async def scenario():
+        scheduler = ModelScheduler(max_concurrency=1, tenant_rpm=0)
+        release = threading.Event()
+        ran = []
+        holder = asyncio.ensure_future(scheduler.run("store-1", release.wait, 5))
+        queued = [asyncio.ensure_future(scheduler.run("store-1", ran.append, index)) for index in range(3)]
+        await wait_until(lambda: scheduler.queued() == 3)
+
+        queued[1].cancel()
+        await asyncio.gather(queued[1], return_exceptions=True)
+        assert scheduler.queued() == 2
+
+        release.set()
+        await asyncio.gather(holder, queued[0], queued[2])
+        return scheduler, ran
+
+    scheduler, ran = asyncio.run(scenario())
+    assert ran == [0, 2]
+    metrics = scheduler.metrics()
+    assert metrics["in_flight"] == 0
+    assert metrics["tenants"]["store-1"]["completed"] == 3
+    assert metrics["tenants"]["store-1"]["failed"] == 0
+
+
+def test_audit_returns_429_when_store_queue_is_full(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "model_scheduler", ModelScheduler(max_queued_per_tenant=0))
+    response = client.post("/audit", headers={"X-Store-Id": "42"},
+                           files={"file": ("shelf.png", DEFAULT_IMAGE.read_bytes(), "image/png")})
+    assert response.status_code == 429
+    assert "store:42" in response.json()["detail"]
+
+
+
+def test_idle_tenant_state_is_evicted():
+    async def scenario():
+        clock = FakeClock()
+        # One token a minute, so a drained bucket stays visibly short of full
+        scheduler = ModelScheduler(max_concurrency=1, tenant_rpm=1, tenant_burst=2, max_tenant_stats=3, clock=clock)
+        for index in range(10):
+            await scheduler.run(f"ip:10.0.0.{index}", lambda: None)
+        assert len(scheduler._buckets) == 10
+        assert len(scheduler.metrics()["tenants"]) == 3
+
+        clock.advance(IDLE_SWEEP_SECONDS * 2)
+        await scheduler.run("recent", lambda: None)
+        await scheduler.run("recent", lambda: None)
+        assert set(scheduler._buckets) == {"recent"}
+
+        release = threading.Event()
+        busy = asyncio.ensure_future(scheduler.run("busy", release.wait, 5))
+        waiting = asyncio.ensure_future(scheduler.run("waiting", lambda: None))
+        await wait_until(lambda: scheduler.queued("waiting") == 1)
+        clock.advance(IDLE_SWEEP_SECONDS)
+        new = asyncio.ensure_future(scheduler.run("new", lambda: None))
+        await wait_until(lambda: scheduler.queued("new") == 1)
+        # Running, queued and not-yet-refilled tenants survive the sweep (buckets are made on dispatch)
+        assert set(scheduler._buckets) == {"recent", "busy"}
+        assert set(scheduler._last_finish[BULK]) == {"recent", "busy", "waiting", "new"}
+
+        release.set()
+        await asyncio.gather(busy, waiting, new)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert not scheduler._running
+    assert len(scheduler.metrics()["tenants"]) == 3